@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from fake_services import FakeServices, ReplayMarket, SyntheticMarket, make_watchlist, wear  # noqa: E402
+
+
+def rss_mb():
+    # Current resident set size where /proc is available, peak RSS otherwise
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    except ImportError:
+        return float("nan")
+
+
+def seed_history(path, items, total_events, days=7):
+    # Synthetic history.log of total_events new/change events on the watched items
+    now = datetime.now()
+    rng = random.Random(2)
+    seq = 0
+    with open(path, "w", encoding="utf-8") as f:
+        listing_id = 0
+        while seq < total_events:
+            listing_id += 1
+            item = rng.choice(items)
+            flt = rng.random()
+            item_key = f"{item['name']} ({wear(flt)})"
+            price = rng.uniform(10, 5000)
+            ts = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            for idx in range(rng.randint(1, 9)):
+                seq += 1
+                if idx:
+                    ts = min(now, ts + timedelta(seconds=rng.uniform(60, 86400)))
+                    price *= rng.uniform(0.9, 1.1)
+                event = {"seq": seq, "op": "new" if idx == 0 else "change", "item": item_key,
+                         "id": f"h{listing_id}", "price": round(price, 2), "float": flt,
+                         "timestamp": ts.isoformat(), "tier": None, "rates": {"EUR": 0.866}}
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    return seq
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def histogram(bot, stage):
+    key = (main.STAGE_SECONDS, (("stage", stage),))
+    with bot.metrics.lock:
+        h = bot.metrics.histograms.get(key)
+        return (h.count, h.sum) if h else (0, 0.0)
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+async def run_for(bot, duration):
+    try:
+        await asyncio.wait_for(bot.poll(), duration)
+    except asyncio.TimeoutError:
+        pass
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Runs CSFloatBot end-to-end against the local stand-in services")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=1, help="poll interval of every item, in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--events-per-second", type=float, default=50)
+    parser.add_argument("--listings-per-item", type=int, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.01)
+    parser.add_argument("--discord-limit", type=int, default=0, help="webhook messages per 2s, 0 for unlimited")
+    parser.add_argument("--history", type=int, default=0, help="history events to seed before starting")
+    parser.add_argument("--replay", help="JSONL file of recorded listing responses")
+    parser.add_argument("--watchlist", help="watchlist to use with --replay")
+    parser.add_argument("--keep", action="store_true", help="keep the data directory")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="csfloat-bench-")
+    if args.replay:
+        with open(args.watchlist, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        market = ReplayMarket(args.replay)
+    else:
+        items = make_watchlist(args.items)
+        market = SyntheticMarket(items, args.events_per_second, args.listings_per_item)
+    for item in items:
+        item['interval'] = args.interval
+    with open(os.path.join(data_dir, "watchlist.json"), "w", encoding="utf-8") as f:
+        json.dump(items, f)
+    if args.history:
+        print(f"Seeding {args.history} history events...")
+        seed_history(os.path.join(data_dir, "history.log"), items, args.history)
+
+    services = FakeServices(market, args.rate_limit_ratio, args.discord_limit)
+    services.start()
+    os.environ.update(services.env())
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "CSFLOAT_TOKEN": "bench",
+        "OPEN_EXCHANGE_RATES_TOKEN": "bench",
+        "DISCORD_USER_ID": "",
+        "MAX_CONCURRENCY": str(args.concurrency),
+        "CSFLOAT_REQUESTS_PER_MINUTE": "0",
+        "METRICS_PORT": "0",
+        "CONTROL_PORT": "0",
+    })
+    # The .env files could point the benchmark at the real services
+    main.load_dotenv = lambda *a, **k: None
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rss_start = rss_mb()
+    started = time.perf_counter()
+    bot = main.CSFloatBot()
+    load_seconds = time.perf_counter() - started
+    rss_loaded = rss_mb()
+    bot.start_fx()
+    bot.notifier.start()
+    log_bytes = file_size(bot.HISTORY_LOG_FILE) + file_size(bot.HISTORY_ARCHIVE_FILE)
+    seq = bot.store.seq
+
+    print(f"Running {len(items)} items in {len(bot.QUERIES)} queries for {args.duration:.0f}s...")
+    started = time.perf_counter()
+    asyncio.run(run_for(bot, args.duration))
+    elapsed = time.perf_counter() - started
+    bot.notifier.stop()
+    rss_end = rss_mb()
+    bot.store.commit()
+    events = bot.store.seq - seq
+    written = file_size(bot.HISTORY_LOG_FILE) + file_size(bot.HISTORY_ARCHIVE_FILE) - log_bytes
+    bot.store.close()
+    services.stop()
+
+    polls = sum(fetch['polls'] for fetch in bot.fetch_stats.values())
+    pages = sum(fetch['pages'] for fetch in bot.fetch_stats.values())
+    saves, save_seconds = histogram(bot, "save_history")
+    latencies = services.latencies
+    listings_in_memory = sum(len(listings) for listings in bot.history.values())
+
+    print(f"History load: {load_seconds:.2f}s ({seq} events, {listings_in_memory} listings in memory at the end)")
+    print(f"Polls: {polls} in {elapsed:.1f}s, {polls / elapsed:.1f} polls/s, {pages / elapsed:.1f} pages/s")
+    print(f"Market: {market.events['new']} new, {market.events['reprice']} repriced, "
+          f"{market.events['delist']} delisted; {services.counters['rate_limited']} of "
+          f"{services.counters['listing_requests']} requests rate limited")
+    print(f"History: {events} events, {saves} saves averaging {save_seconds / max(saves, 1) * 1000:.2f}ms, "
+          f"{written / max(events, 1):.0f} bytes/event")
+    print(f"Notifications: {services.counters['webhook_embeds']} embeds in {services.counters['webhook_messages']} "
+          f"messages, {services.counters['webhook_rate_limited']} rate limited, "
+          f"{services.counters['webhook_rejected']} rejected")
+    print(f"Listing to notification: p50 {percentile(latencies, 50) * 1000:.0f}ms, "
+          f"p90 {percentile(latencies, 90) * 1000:.0f}ms, p99 {percentile(latencies, 99) * 1000:.0f}ms "
+          f"({len(latencies)} samples)")
+    print(f"Memory: {rss_start:.1f}MB at start, {rss_loaded:.1f}MB after loading, {rss_end:.1f}MB at the end "
+          f"({(rss_end - rss_loaded) / max(events, 1) * 1024:.2f}KB per new event)")
+    if args.keep:
+        print(f"Data kept in {data_dir}")
+    else:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,185 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from fx import format_amount  # noqa: E402
+from history import ListingRecord  # noqa: E402
+from mapper import EmbedMapper  # noqa: E402
+from tiers import Tiers  # noqa: E402
+
+SKINS = [(508, "★ M9 Bayonet | Crimson Web"), (507, "★ Karambit | Crimson Web")]
+WEARS = ["Factory New", "Minimal Wear", "Field-Tested"]
+RATE = 0.866
+
+
+class LegacyEmbedMapper:
+    # Former EmbedMapper, kept as the reference
+    @staticmethod
+    def map_to_new_offer(listing, rate, currency="EUR"):
+        listing_id = str(listing['id'])
+        price_usd = listing['price'] / 100
+        price = price_usd * rate
+        flt = listing['item']['float_value']
+        note = listing.get("description")
+        tier = Tiers.determine(listing['item']['def_index'], listing['item']['paint_seed'])
+        link = f"https://csfloat.com/item/{listing_id}"
+
+        fields = [
+            {
+                "name": "💰 Price",
+                "value": f"**{format_amount(price, currency)}** (**${price_usd:.2f}**)",
+                "inline": True
+            },
+            {
+                "name": "💎 Float",
+                "value": f"{flt}",
+                "inline": False
+            },
+        ]
+        if tier is not None:
+            fields.append({
+                "name": "🏅 Tier",
+                "value": f"{tier}",
+                "inline": True
+            })
+        if note is not None:
+            fields.append({
+                "name": "📝 Note",
+                "value": f"{note}",
+                "inline": False
+            })
+        return {
+            "title": "🆕 New offer detected!",
+            "description": f"**{listing['item']['market_hash_name']}**",
+            "color": 0x2ecc71,
+            "fields": fields,
+            "url": link
+        }
+
+    @staticmethod
+    def map_to_edited_offer(prev, listing, rate, currency="EUR"):
+        prev_price = prev.price * rate
+        listing_id = str(listing['id'])
+        price_usd = listing['price'] / 100
+        price = price_usd * rate
+        delta = price - prev_price
+        percent = (abs(delta) / prev_price) * 100 if prev_price else 0
+        flt = listing['item']['float_value']
+        tier = Tiers.determine(listing['item']['def_index'], listing['item']['paint_seed'])
+        note = listing.get("description")
+        link = f"https://csfloat.com/item/{listing_id}"
+
+        if price_usd < prev.price:
+            change_msg = f"Decrease of **{format_amount(abs(delta), currency)}** (-{percent:.2f}%)"
+            color = 0x27ae60  # Green
+        else:
+            change_msg = f"Increase of **{format_amount(abs(delta), currency)}** (+{percent:.2f}%)"
+            color = 0xe67e22  # Orange
+        fields = [
+            {
+                "name": "Previous price",
+                "value": f"**{format_amount(prev_price, currency)}** (**${prev.price:.2f}**)",
+                "inline": True
+            },
+            {
+                "name": "New price",
+                "value": f"**{format_amount(price, currency)}** (**${price_usd:.2f}**)",
+                "inline": True
+            },
+            {
+                "name": "Change",
+                "value": change_msg,
+                "inline": False
+            },
+            {
+                "name": "💎 Float",
+                "value": f"{flt}",
+                "inline": True
+            },
+        ]
+        if tier is not None:
+            fields.append({
+                "name": "🏅 Tier",
+                "value": f"{tier}",
+                "inline": True
+            })
+        if note is not None:
+            fields.append({
+                "name": "📝 Note",
+                "value": f"{note}",
+                "inline": False
+            })
+        return {
+            "title": "🔄 Price change detected!",
+            "description": f"**{listing['item']['market_hash_name']}**",
+            "color": color,
+            "fields": fields,
+            "url": link
+        }
+
+
+def generate_events(count, listings=200):
+    # Bursts of reprices on a few hundred listings of the same skins, as seen on the hot path
+    rng = random.Random(0)
+    pool = []
+    for idx in range(listings):
+        def_index, name = rng.choice(SKINS)
+        pool.append({
+            "id": str(1000000 + idx),
+            "price": rng.randint(30000, 300000),
+            "description": "Nice pattern" if rng.random() < 0.2 else None,
+            "item": {"market_hash_name": f"{name} ({rng.choice(WEARS)})", "def_index": def_index,
+                     "paint_seed": rng.randint(0, 1000), "float_value": rng.uniform(0, 0.38)},
+        })
+    for listing in pool:
+        if listing['description'] is None:
+            del listing['description']
+    events = []
+    for idx in range(count):
+        listing = dict(pool[idx % listings])
+        prev_price = None if idx < listings else listing['price'] / 100
+        listing['price'] = int(listing['price'] * rng.uniform(0.9, 1.1))
+        events.append((listing, prev_price))
+    return events
+
+
+def run_legacy(events):
+    return [LegacyEmbedMapper.map_to_new_offer(listing, RATE) if prev_price is None
+            else LegacyEmbedMapper.map_to_edited_offer(ListingRecord(prev_price, 0, 0), listing, RATE)
+            for listing, prev_price in events]
+
+
+def run_mapper(mapper, events):
+    return [mapper.map_to_new_offer(listing, RATE) if prev_price is None
+            else mapper.map_to_edited_offer(prev_price, listing, RATE)
+            for listing, prev_price in events]
+
+
+def measure(name, render, count, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = render()
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:>22}: {count / best:>12,.0f} events/s ({best / count * 1e6:.2f}µs per event)")
+    return result, best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    events = generate_events(count)
+    mapper = EmbedMapper("EUR")
+    print(f"Rendering {count} events ({sum(1 for _, prev in events if prev is not None)} reprices)...")
+    legacy, legacy_time = measure("legacy mapper", lambda: run_legacy(events), count)
+    embeds, embeds_time = measure("one embed per event", lambda: run_mapper(mapper, events), count)
+    assert legacy == embeds, "the mapper must produce the same embeds as the legacy one"
+    digests, digest_time = measure("digest", lambda: mapper.map_to_digest(events, RATE), count)
+    print(f"One embed per event: {legacy_time / embeds_time:.2f}x the legacy mapper; digest: {len(digests)} embeds "
+          f"instead of {count}, {legacy_time / digest_time:.2f}x faster than the legacy mapper")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from stats import StatsIndex  # noqa: E402
+
+ITEMS = ["★ M9 Bayonet | Crimson Web", "★ Karambit | Crimson Web"]
+TIERS = [None, "Single Web - Tier 3", "Single Web - Tier 2", "Double Web - Tier 1"]
+WINDOWS = (1, 24, 24 * 7, 24 * 30)
+
+
+def generate_history(total_changes, days=30, changes_per_listing=5):
+    # Same layout as the former history.json: ISO timestamps and a full change list per listing
+    now = datetime.now()
+    history = {item: {} for item in ITEMS}
+    events = []
+    listing_id = 0
+    while len(events) < total_changes:
+        item = random.choice(ITEMS)
+        tier = random.choice(TIERS)
+        start = now - timedelta(seconds=random.uniform(0, days * 86400))
+        price = random.uniform(300, 3000)
+        flt = random.uniform(0, 0.15)
+        changes = []
+        ts = start
+        for idx in range(random.randint(1, changes_per_listing * 2 - 1)):
+            if idx:
+                ts = min(now, ts + timedelta(seconds=random.uniform(60, 86400)))
+                price *= random.uniform(0.9, 1.1)
+            changes.append({"price": price, "float": flt, "timestamp": ts.isoformat()})
+            events.append((item, "new" if idx == 0 else "change", price, flt, ts.timestamp(), tier))
+        listing_id += 1
+        history[item][str(listing_id)] = {**changes[-1], "changes": changes}
+    return history, events
+
+
+def full_scan(history, period_hours):
+    # Former CSFloatBot.stats_message algorithm
+    since = datetime.now() - timedelta(hours=period_hours)
+    new_offers = 0
+    price_changes = 0
+    min_prices = {}
+    for item_key in ITEMS:
+        min_price = None
+        min_float = None
+        for listing_id, info in history.get(item_key, {}).items():
+            ts = datetime.fromisoformat(info['timestamp'])
+            if ts >= since:
+                new_offers += 1
+                if min_price is None or info['price'] < min_price:
+                    min_price = info['price']
+                    min_float = info['float']
+            for idx, change in enumerate(info.get("changes", [])):
+                if idx == 0:
+                    continue
+                if datetime.fromisoformat(change['timestamp']) >= since:
+                    price_changes += 1
+        if min_price is not None:
+            min_prices[item_key] = (min_price, min_float)
+    return new_offers, price_changes, min_prices
+
+
+def indexed(index, period_hours):
+    until = time.time()
+    since = until - period_hours * 3600
+    result = {}
+    for item_key in ITEMS:
+        result[item_key] = (index.summary(item_key, since, until),
+                            index.percentiles(item_key, since, until, (50, 90)))
+    return result
+
+
+def main():
+    total_changes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Generating {total_changes} changes...")
+    history, events = generate_history(total_changes)
+
+    index = StatsIndex()
+    started = time.perf_counter()
+    for event in events:
+        index.add(*event)
+    ingest = time.perf_counter() - started
+    print(f"Index ingest: {ingest:.2f}s total, {ingest / len(events) * 1e6:.2f}µs per event")
+
+    print(f"{'window':>8} {'full scan':>12} {'indexed':>12} {'speedup':>10}")
+    for hours in WINDOWS:
+        started = time.perf_counter()
+        full_scan(history, hours)
+        scan = time.perf_counter() - started
+        started = time.perf_counter()
+        indexed(index, hours)
+        fast = time.perf_counter() - started
+        print(f"{hours:>7}h {scan * 1000:>10.1f}ms {fast * 1000:>10.3f}ms {scan / fast:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WEARS = ((0.07, "Factory New"), (0.15, "Minimal Wear"), (0.38, "Field-Tested"), (0.45, "Well-Worn"),
+         (1.0, "Battle-Scarred"))
+FX_RATES = {"USD": 1.0, "EUR": 0.866, "GBP": 0.75, "JPY": 150.0, "CNY": 7.2, "PLN": 3.7, "RUB": 90.0}
+# Discord allows 5 messages per 2 seconds on a webhook
+DISCORD_WINDOW = 2.0
+# Discord refuses messages whose embeds hold more text than this
+DISCORD_MAX_MESSAGE_CHARS = 6000
+# Listing links of digest embeds
+LISTING_LINK = re.compile(r"/item/([^)\s]+)\)")
+
+
+def make_watchlist(count, interval=None, max_price=None):
+    # Distinct def_index/paint_index pairs, so every item is a separate query
+    items = []
+    for idx in range(count):
+        item = {
+            "name": f"Bench Item {idx}",
+            "def_index": 500 + idx % 100,
+            "paint_index": 1 + idx // 100,
+            "min_float": 0,
+            "max_float": 1,
+        }
+        if interval is not None:
+            item['interval'] = interval
+        if max_price is not None:
+            item['max_price'] = max_price
+        items.append(item)
+    return items
+
+
+def wear(flt):
+    for bound, name in WEARS:
+        if flt < bound:
+            return name
+    return WEARS[-1][1]
+
+
+class SyntheticMarket:
+    # Listings of every watched item, changed at events_per_second: new listings,
+    # reprices and delistings. The time of each change is kept so that the webhook can
+    # measure how long it took to be notified.
+
+    def __init__(self, items, events_per_second=10.0, listings_per_item=20, seed=0):
+        self.rng = random.Random(seed)
+        self.events_per_second = events_per_second
+        self.lock = threading.Lock()
+        self.listings = {}
+        self.names = {}
+        self.event_times = {}
+        self.events = {"new": 0, "reprice": 0, "delist": 0}
+        self.next_id = 1
+        for item in items:
+            key = (item['def_index'], item['paint_index'])
+            self.names[key] = item['name']
+            self.listings[key] = {}
+            for _ in range(listings_per_item):
+                self.add_listing(key, None)
+        self.keys = list(self.listings)
+        self.updated = time.monotonic()
+        self.carry = 0.0
+
+    def add_listing(self, key, now):
+        flt = self.rng.random()
+        listing_id = str(self.next_id)
+        self.next_id += 1
+        self.listings[key][listing_id] = {
+            "id": listing_id,
+            "price": self.rng.randint(1000, 500000),
+            "item": {
+                "market_hash_name": f"{self.names[key]} ({wear(flt)})",
+                "def_index": key[0],
+                "paint_index": key[1],
+                "paint_seed": self.rng.randint(0, 1000),
+                "float_value": flt,
+            },
+        }
+        if now is not None:
+            self.event_times[listing_id] = now
+
+    def advance(self):
+        # Called with the lock held
+        now = time.monotonic()
+        self.carry += (now - self.updated) * self.events_per_second
+        self.updated = now
+        wall = time.time()
+        while self.carry >= 1:
+            self.carry -= 1
+            key = self.rng.choice(self.keys)
+            listings = self.listings[key]
+            roll = self.rng.random()
+            if roll < 0.3 or not listings:
+                self.add_listing(key, wall)
+                self.events['new'] += 1
+            elif roll < 0.8:
+                listing = listings[self.rng.choice(list(listings))]
+                listing['price'] = max(100, int(listing['price'] * self.rng.uniform(0.8, 1.2)))
+                self.event_times[listing['id']] = wall
+                self.events['reprice'] += 1
+            else:
+                listings.pop(self.rng.choice(list(listings)))
+                self.events['delist'] += 1
+
+    def snapshot(self, key, first_page):
+        with self.lock:
+            if first_page:
+                self.advance()
+            return list(self.listings.get(key, {}).values())
+
+    def event_time(self, listing_id):
+        with self.lock:
+            return self.event_times.pop(listing_id, None)
+
+    def find(self, listing_id):
+        with self.lock:
+            for listings in self.listings.values():
+                if listing_id in listings:
+                    return listings[listing_id]
+        return None
+
+
+class ReplayMarket:
+    # Serves recorded responses: a JSONL file of {"def_index", "paint_index", "data"}
+    # lines, one result set per poll and per item, replayed in order and then looped
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.recordings = {}
+        self.positions = {}
+        self.current = {}
+        self.seen = {}
+        self.event_times = {}
+        self.events = {"new": 0, "reprice": 0, "delist": 0}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    key = (record['def_index'], record['paint_index'])
+                    self.recordings.setdefault(key, []).append(record['data'])
+
+    def snapshot(self, key, first_page):
+        with self.lock:
+            recordings = self.recordings.get(key)
+            if not recordings:
+                return []
+            if first_page or key not in self.current:
+                position = self.positions.get(key, 0)
+                self.positions[key] = position + 1
+                self.current[key] = recordings[position % len(recordings)]
+                self.record_changes(key, self.current[key])
+            return self.current[key]
+
+    def record_changes(self, key, listings):
+        now = time.time()
+        seen = self.seen.setdefault(key, {})
+        current = {str(listing['id']): listing['price'] for listing in listings}
+        for listing_id, price in current.items():
+            if listing_id not in seen:
+                self.events['new'] += 1
+                self.event_times[listing_id] = now
+            elif seen[listing_id] != price:
+                self.events['reprice'] += 1
+                self.event_times[listing_id] = now
+        self.events['delist'] += len(seen.keys() - current.keys())
+        self.seen[key] = current
+
+    def event_time(self, listing_id):
+        with self.lock:
+            return self.event_times.pop(listing_id, None)
+
+    def find(self, listing_id):
+        with self.lock:
+            for listings in self.current.values():
+                for listing in listings:
+                    if str(listing['id']) == listing_id:
+                        return listing
+        return None
+
+
+class FakeServices:
+    # Local stand-in for the CSFloat listings API, the Discord webhook and Open
+    # Exchange Rates. rate_limit_ratio of the listing requests are answered with a 429.
+
+    def __init__(self, market, rate_limit_ratio=0.0, discord_limit=0, host="127.0.0.1", port=0):
+        self.market = market
+        self.rate_limit_ratio = rate_limit_ratio
+        self.discord_limit = discord_limit
+        self.rng = random.Random(1)
+        self.lock = threading.Lock()
+        self.counters = {"listing_requests": 0, "rate_limited": 0, "webhook_messages": 0, "webhook_embeds": 0,
+                         "webhook_rate_limited": 0, "webhook_rejected": 0, "fx_requests": 0}
+        self.latencies = []
+        self.discord_window = (0, 0)
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.endswith("/listings"):
+                    services.listings(self, parse_qs(url.query))
+                elif "/listings/" in url.path:
+                    listing = services.market.find(url.path.rsplit("/", 1)[-1])
+                    if listing is None:
+                        self.reply(404, {"code": 4, "message": "listing not found"})
+                    else:
+                        self.reply(200, listing)
+                elif url.path.endswith("/latest.json"):
+                    with services.lock:
+                        services.counters['fx_requests'] += 1
+                    self.reply(200, {"timestamp": int(time.time()), "base": "USD", "rates": FX_RATES})
+                else:
+                    self.reply(404, {"message": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if urlparse(self.path).path.endswith("/webhook"):
+                    services.webhook(self, json.loads(body))
+                else:
+                    self.reply(404, {"message": "not found"})
+
+            def reply(self, status, data, headers=None):
+                body = json.dumps(data).encode("utf-8") if data is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self):
+        return {
+            "CSFLOAT_API_URL": f"{self.base_url}/api/v1",
+            "DISCORD_WEBHOOK": f"{self.base_url}/webhook",
+            "OPEN_EXCHANGE_RATES_URL": f"{self.base_url}/api/latest.json",
+        }
+
+    def listings(self, handler, query):
+        with self.lock:
+            self.counters['listing_requests'] += 1
+            limited = self.rng.random() < self.rate_limit_ratio
+            if limited:
+                self.counters['rate_limited'] += 1
+        if limited:
+            handler.reply(429, {"code": 429, "message": "Too many requests"}, {"Retry-After": "1"})
+            return
+
+        def arg(name, cast, default=None):
+            return cast(query[name][0]) if name in query else default
+
+        key = (arg("def_index", int), arg("paint_index", int))
+        cursor = arg("cursor", int, 0)
+        limit = arg("limit", int, 50)
+        min_float = arg("min_float", float, 0)
+        max_float = arg("max_float", float, 1)
+        min_price = arg("min_price", int, 0)
+        max_price = arg("max_price", int, float("inf"))
+        paint_seed = arg("paint_seed", int)
+        listings = sorted(
+            (listing for listing in self.market.snapshot(key, cursor == 0)
+             if min_float <= listing['item']['float_value'] <= max_float
+             and min_price <= listing['price'] <= max_price
+             and (paint_seed is None or listing['item']['paint_seed'] == paint_seed)),
+            key=lambda listing: listing['price'])
+        page = listings[cursor:cursor + limit]
+        handler.reply(200, {"data": page, "cursor": str(cursor + limit) if cursor + limit < len(listings) else None})
+
+    def webhook(self, handler, payload):
+        now = time.time()
+        if self.discord_limit:
+            with self.lock:
+                started, count = self.discord_window
+                if now - started >= DISCORD_WINDOW:
+                    started, count = now, 0
+                limited = count >= self.discord_limit
+                if not limited:
+                    count += 1
+                self.discord_window = (started, count)
+                if limited:
+                    self.counters['webhook_rate_limited'] += 1
+            if limited:
+                handler.reply(429, {"message": "You are being rate limited.",
+                                    "retry_after": round(started + DISCORD_WINDOW - now, 3)})
+                return
+            headers = {"X-RateLimit-Remaining": str(self.discord_limit - count),
+                       "X-RateLimit-Reset-After": f"{started + DISCORD_WINDOW - now:.3f}"}
+        else:
+            headers = {}
+        embeds = payload.get("embeds", [])
+        size = sum(len(embed.get("title", "")) + len(embed.get("description", ""))
+                   + sum(len(field['name']) + len(field['value']) for field in embed.get("fields", []))
+                   for embed in embeds)
+        if size > DISCORD_MAX_MESSAGE_CHARS:
+            with self.lock:
+                self.counters['webhook_rejected'] += 1
+            handler.reply(400, {"message": "Invalid Form Body", "code": 50035}, headers)
+            return
+        for embed in embeds:
+            if "url" in embed:
+                listing_ids = [embed['url'].rsplit("/", 1)[-1]]
+            else:
+                listing_ids = LISTING_LINK.findall(embed.get("description", ""))
+            for listing_id in listing_ids:
+                event_time = self.market.event_time(listing_id)
+                if event_time is not None:
+                    with self.lock:
+                        self.latencies.append(now - event_time)
+        with self.lock:
+            self.counters['webhook_messages'] += 1
+            self.counters['webhook_embeds'] += len(embeds)
+        handler.reply(204, None, headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for CSFloat, Discord and Open Exchange Rates")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--events-per-second", type=float, default=10)
+    parser.add_argument("--listings-per-item", type=int, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--discord-limit", type=int, default=0, help="webhook messages per 2s, 0 for unlimited")
+    parser.add_argument("--replay", help="JSONL file of recorded listing responses")
+    parser.add_argument("--watchlist", help="where to write the matching watchlist", default="watchlist.json")
+    args = parser.parse_args()
+
+    items = make_watchlist(args.items)
+    if args.replay:
+        market = ReplayMarket(args.replay)
+    else:
+        market = SyntheticMarket(items, args.events_per_second, args.listings_per_item)
+        with open(args.watchlist, "w", encoding="utf-8") as f:
+            json.dump(items, f, indent=4)
+        print(f"Watchlist of {args.items} items written to {args.watchlist}")
+    services = FakeServices(market, args.rate_limit_ratio, args.discord_limit, port=args.port)
+    print("Point the bot at the stand-in with:")
+    for name, value in services.env().items():
+        print(f"{name}={value}")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps({**services.counters, **market.events}))
+
+
+if __name__ == "__main__":
+    main()
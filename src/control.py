@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_CONTROL_HOST = "127.0.0.1"
+DEFAULT_CONTROL_PORT = 9109
+MAX_HEADER_LINES = 100
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+class ControlServer:
+    # Minimal HTTP server running on the bot's event loop. Handlers take the query
+    # parameters and return text or a JSON-serializable object; blocking handlers run
+    # on the default executor so that they never hold up the polling loop. A
+    # ValueError answers 400 and a KeyError 404.
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self.server = None
+
+    def route(self, method, path, handler, blocking=False):
+        self.routes[(method, path)] = (handler, blocking)
+
+    async def start(self):
+        if not self.port:
+            return
+        try:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        except OSError as e:
+            logging.error(f"Error starting the control server on {self.host}:{self.port}: {e}")
+            return
+        logging.info("Control API available at http://%s:%d/", self.host, self.port)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            # Clients such as curl send non-ASCII query characters as raw UTF-8
+            request_line = (await reader.readline()).decode("utf-8", errors="replace").split()
+            length = 0
+            for _ in range(MAX_HEADER_LINES):
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            if length:
+                await reader.readexactly(length)
+            if len(request_line) < 2:
+                status, body = 400, "Malformed request"
+            else:
+                status, body = await self.dispatch(request_line[0].upper(), request_line[1])
+            if isinstance(body, str):
+                content_type, data = "text/plain; charset=utf-8", body.encode("utf-8")
+            else:
+                content_type, data = "application/json", json.dumps(body, ensure_ascii=False, indent=2).encode("utf-8")
+            writer.write((f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                          f"Content-Type: {content_type}\r\n"
+                          f"Content-Length: {len(data)}\r\n"
+                          "Connection: close\r\n\r\n").encode("latin-1") + data)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        params = dict(parse_qsl(url.query))
+        if path == "/" and method == "GET":
+            return 200, sorted(f"{m} {p}" for m, p in self.routes)
+        if (method, path) not in self.routes:
+            if any(p == path for _, p in self.routes):
+                return 405, f"{method} not allowed on {path}"
+            return 404, f"Unknown path {path}"
+        handler, blocking = self.routes[(method, path)]
+        try:
+            if blocking:
+                result = await asyncio.get_running_loop().run_in_executor(None, handler, params)
+            else:
+                result = handler(params)
+            return 200, result
+        except ValueError as e:
+            return 400, str(e)
+        except KeyError as e:
+            return 404, f"Unknown {e.args[0] if e.args else 'key'}"
+        except Exception as e:
+            logging.error(f"Error handling {method} {path}: {e}")
+            return 500, str(e)
@@ -0,0 +1,94 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from shard import SharedState
+
+RESTART_DELAY = 10
+
+
+class Coordinator:
+    # Runs SHARD_WORKERS bot processes sharing shard_db. Workers split the watchlist
+    # among themselves by consistent hashing over the live members; when one exits,
+    # it is removed from the membership right away, so that the others take over its
+    # items, and it is restarted after RESTART_DELAY under the same id, so that it
+    # resends the notifications it had claimed but not delivered.
+
+    def __init__(self, command, workers, data_dir, shard_db, control_port=0, metrics_port=0):
+        self.command = command
+        self.workers = workers
+        self.data_dir = data_dir
+        self.shard_db = shard_db
+        self.control_port = control_port
+        self.metrics_port = metrics_port
+        self.shared = SharedState(shard_db, "coordinator")
+        self.processes = {}
+        self.running = False
+        self.lock = threading.Lock()
+
+    def worker_env(self, worker_id, idx):
+        data_dir = os.path.join(self.data_dir, worker_id)
+        os.makedirs(data_dir, exist_ok=True)
+        env = dict(os.environ)
+        env.update({
+            "WORKER_ID": worker_id,
+            "SHARD_DB": self.shard_db,
+            "DATA_DIR": data_dir,
+            # Every worker reads the same watchlist
+            "WATCHLIST_FILE": os.getenv("WATCHLIST_FILE", os.path.join(self.data_dir, "watchlist.json")),
+            "TIERS_FILE": os.getenv("TIERS_FILE", os.path.join(self.data_dir, "tiers.json")),
+            "CONTROL_PORT": str(self.control_port + 1 + idx if self.control_port else 0),
+            "METRICS_PORT": str(self.metrics_port + 1 + idx if self.metrics_port else 0),
+        })
+        return env
+
+    def spawn(self, worker_id, idx):
+        process = subprocess.Popen(self.command, env=self.worker_env(worker_id, idx))
+        with self.lock:
+            self.processes[worker_id] = process
+        logging.info("Started %s (pid %d)", worker_id, process.pid)
+        threading.Thread(target=self.watch, args=(worker_id, idx, process), name=f"watch-{worker_id}",
+                         daemon=True).start()
+
+    def watch(self, worker_id, idx, process):
+        code = process.wait()
+        if not self.running:
+            return
+        logging.error("%s exited with code %s, rebalancing its items", worker_id, code)
+        try:
+            self.shared.leave(worker_id)
+        except Exception as e:
+            logging.error(f"Error removing {worker_id} from the shard membership: {e}")
+        time.sleep(RESTART_DELAY)
+        if self.running:
+            self.spawn(worker_id, idx)
+
+    def run(self):
+        logging.info("Coordinator started with %d workers", self.workers)
+        self.running = True
+        # Undelivered claims of workers dropped since the last run (fewer SHARD_WORKERS)
+        moved = self.shared.reassign_claims([f"worker-{idx}" for idx in range(self.workers)], "worker-0")
+        if moved:
+            logging.warning("Moved %d undelivered notification(s) of removed workers to worker-0", moved)
+        for idx in range(self.workers):
+            self.spawn(f"worker-{idx}", idx)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            with self.lock:
+                processes = list(self.processes.items())
+            for worker_id, process in processes:
+                process.terminate()
+            for worker_id, process in processes:
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                self.shared.leave(worker_id)
+            self.shared.close()
@@ -0,0 +1,57 @@
+from tiers import Tiers
+
+
+class ListingFilter:
+    # Compiled from a watched item: the bounds the CSFloat API understands are sent
+    # with the query, and every listing is checked again in-process (cheapest checks
+    # first) before any lock, history or rendering work.
+
+    def __init__(self, item):
+        self.checks = []
+        self.params = {}
+
+        min_price = item.get("min_price")
+        max_price = item.get("max_price")
+        if min_price is not None or max_price is not None:
+            min_cents = round(min_price * 100) if min_price is not None else 0
+            max_cents = round(max_price * 100) if max_price is not None else float("inf")
+            if min_price is not None:
+                self.params['min_price'] = min_cents
+            if max_price is not None:
+                self.params['max_price'] = max_cents
+            self.checks.append(("price", lambda listing: min_cents <= listing['price'] <= max_cents))
+
+        min_float = item.get("min_float", 0)
+        max_float = item.get("max_float", 1)
+        self.checks.append(
+            ("float", lambda listing: min_float <= listing['item']['float_value'] <= max_float)
+        )
+
+        paint_seeds = item.get("paint_seeds")
+        if paint_seeds:
+            seeds = frozenset(paint_seeds)
+            if len(seeds) == 1:
+                self.params['paint_seed'] = next(iter(seeds))
+            self.checks.append(("paint_seed", lambda listing: listing['item'].get("paint_seed") in seeds))
+
+        tiers = item.get("tiers")
+        if tiers:
+            allowed = frozenset(tiers)
+            self.checks.append(("tier", lambda listing: Tiers.determine(
+                listing['item']['def_index'], listing['item'].get("paint_seed")) in allowed))
+
+        self.counters = {"received": 0, "accepted": 0}
+        for stage, _ in self.checks:
+            self.counters[f"rejected_{stage}"] = 0
+
+    def query_params(self):
+        return self.params
+
+    def accept(self, listing):
+        self.counters['received'] += 1
+        for stage, check in self.checks:
+            if not check(listing):
+                self.counters[f"rejected_{stage}"] += 1
+                return False
+        self.counters['accepted'] += 1
+        return True
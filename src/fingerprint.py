@@ -0,0 +1,26 @@
+class ResultFingerprint:
+    # Compact image of the result set of one watched item: (id, price in cents) pairs
+    # per page, so that an unchanged page is detected with a single tuple comparison
+
+    __slots__ = ("pages", "prices", "complete")
+
+    def __init__(self):
+        self.pages = []
+        self.prices = {}
+        self.complete = False
+
+    def add_page(self, listings):
+        page = tuple((listing['id'], listing['price']) for listing in listings)
+        self.pages.append(page)
+        self.prices.update(page)
+        return page
+
+    def page_unchanged(self, idx, page):
+        return idx < len(self.pages) and self.pages[idx] == page
+
+    def listing_unchanged(self, listing):
+        return self.prices.get(listing['id']) == listing['price']
+
+    def removed(self, current):
+        # Only meaningful when current holds the whole result set
+        return self.prices.keys() - current.prices.keys()
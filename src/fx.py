@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+
+OPEN_EXCHANGE_RATES_URL = "https://openexchangerates.org/api/latest.json"
+DEFAULT_CURRENCY = "EUR"
+DEFAULT_FX_TTL_HOURS = 6
+FX_RETRY_DELAY = 300
+# Open Exchange Rates updates hourly at best
+MIN_FX_TTL = 600
+# Used until a rate has been fetched or read from the cache
+DEFAULT_RATES = {"USD": 1.0, "EUR": 0.866}
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "CNY": "¥", "PLN": "zł", "RUB": "₽"}
+
+
+def format_amount(amount, currency):
+    return f"{amount:.2f}{CURRENCY_SYMBOLS.get(currency, ' ' + currency)}"
+
+
+class RateProvider:
+    # USD -> currency rates, loaded instantly from an on-disk cache at startup and
+    # refreshed in the background once the cache is older than the TTL
+
+    def __init__(self, http, token, cache_file, currencies, ttl_hours=DEFAULT_FX_TTL_HOURS,
+                 url=OPEN_EXCHANGE_RATES_URL):
+        self.http = http
+        self.url = url
+        self.token = token
+        self.cache_file = cache_file
+        self.currencies = [currency for currency in currencies if currency != "USD"]
+        self.ttl = max(ttl_hours * 3600, MIN_FX_TTL)
+        self.rates = {currency: rate for currency, rate in DEFAULT_RATES.items()}
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+        self.load_cache()
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self.lock:
+                self.rates.update(data['rates'])
+                self.fetched_at = data['timestamp']
+        except Exception as e:
+            logging.error(f"Error loading cached exchange rates: {e}")
+
+    def save_cache(self):
+        with self.lock:
+            data = {"timestamp": self.fetched_at, "rates": dict(self.rates)}
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def refresh(self):
+        params = {"app_id": self.token, "symbols": ",".join(self.currencies)}
+        r = self.http.get(self.url, params=params)
+        data = r.json()
+        rates = {currency: data['rates'][currency] for currency in self.currencies if currency in data['rates']}
+        missing = [currency for currency in self.currencies if currency not in rates]
+        if missing:
+            logging.error("No exchange rate returned for %s, check CURRENCY and CURRENCIES", ", ".join(missing))
+        with self.lock:
+            self.rates.update(rates)
+            self.fetched_at = time.time()
+        self.save_cache()
+        logging.info("Exchange rates updated: %s", ", ".join(f"{c} {r}" for c, r in rates.items()))
+
+    def start(self):
+        if not self.token:
+            logging.warning("OPEN_EXCHANGE_RATES_TOKEN not set, using cached or default rates.")
+            return
+        with self.lock:
+            missing = [currency for currency in self.currencies if currency not in self.rates]
+        if missing:
+            # No cached or default rate to show prices with: fetch once before starting
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Error fetching exchange rate: {e}")
+        threading.Thread(target=self.refresh_loop, name="fx", daemon=True).start()
+
+    def refresh_loop(self):
+        while True:
+            delay = self.fetched_at + self.ttl - time.time()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Error fetching exchange rate: {e}")
+                time.sleep(FX_RETRY_DELAY)
+
+    def has_rate(self, currency):
+        with self.lock:
+            return currency == "USD" or currency in self.rates
+
+    def rate(self, currency):
+        # KeyError when no rate was ever fetched, cached or known by default for currency
+        if currency == "USD":
+            return 1.0
+        with self.lock:
+            return self.rates[currency]
+
+    def snapshot(self):
+        # Rates of every configured currency, stored with history events
+        with self.lock:
+            return {currency: self.rates[currency] for currency in self.currencies if currency in self.rates}
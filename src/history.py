@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+DEFAULT_COMPACT_EVERY = 10000
+DEFAULT_RETENTION_HOURS = 24 * 7
+DEFAULT_MAX_LISTINGS_PER_ITEM = 1000
+SNAPSHOT_VERSION = 2
+COPY_CHUNK_SIZE = 1 << 20
+
+
+class ListingRecord:
+    # Hot state kept in memory for each active listing; timestamps are epoch seconds
+    __slots__ = ("price", "float", "first_seen", "timestamp", "last_seen")
+
+    def __init__(self, price, flt, first_seen, timestamp=None, last_seen=None):
+        self.price = price
+        self.float = flt
+        self.first_seen = first_seen
+        self.timestamp = first_seen if timestamp is None else timestamp
+        self.last_seen = self.timestamp if last_seen is None else last_seen
+
+    def to_row(self):
+        return [self.price, self.float, self.first_seen, self.timestamp, self.last_seen]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+class HistoryStore(ABC):
+    # Storage interface used by CSFloatBot: events are recorded one by one and
+    # made durable in batches by commit()
+
+    @abstractmethod
+    def load(self, listener=None):
+        pass
+
+    @abstractmethod
+    def record_new(self, item_key, listing_id, price, flt, timestamp, tier=None, rates=None):
+        pass
+
+    @abstractmethod
+    def record_change(self, item_key, listing_id, price, flt, timestamp, tier=None, rates=None):
+        pass
+
+    @abstractmethod
+    def record_removal(self, item_key, listing_id, price, flt, timestamp):
+        pass
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def iter_events(self):
+        pass
+
+    def needs_compaction(self):
+        return False
+
+    def snapshot(self, history):
+        return None
+
+    def compact(self, snapshot):
+        pass
+
+    def close(self):
+        pass
+
+
+def parse_timestamp(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def apply_event(history, event):
+    listing_id = event['id']
+    ts = parse_timestamp(event['timestamp'])
+    listings = history.setdefault(event['item'], {})
+    if event['op'] == "remove":
+        listings.pop(listing_id, None)
+        return
+    record = listings.get(listing_id)
+    if event['op'] == "new" or record is None:
+        listings[listing_id] = ListingRecord(event['price'], event['float'], ts)
+    else:
+        record.price = event['price']
+        record.float = event['float']
+        record.timestamp = ts
+        record.last_seen = max(record.last_seen, ts)
+
+
+def apply_retention(history, max_age_seconds, max_per_item, now, active=frozenset()):
+    # Drops listings not seen for max_age_seconds (unless their id is in active), then
+    # keeps only the max_per_item most recently seen ones per item. Their events stay
+    # available in the archive.
+    evicted = 0
+    cutoff = now - max_age_seconds
+    for item_key, listings in history.items():
+        stale = [listing_id for listing_id, record in listings.items()
+                 if record.last_seen < cutoff and listing_id not in active]
+        if len(listings) - len(stale) > max_per_item:
+            stale_ids = set(stale)
+            kept = sorted((listing_id for listing_id in listings if listing_id not in stale_ids),
+                          key=lambda listing_id: listings[listing_id].last_seen)
+            stale.extend(kept[:len(kept) - max_per_item])
+        for listing_id in stale:
+            del listings[listing_id]
+        evicted += len(stale)
+    return evicted
+
+
+class EventLogStore(HistoryStore):
+    # history.json holds a snapshot of the hot listings, history.log the events
+    # appended since that snapshot and history.archive.jsonl every event older than
+    # it. Each event carries a sequence number so that replaying is idempotent if we
+    # crash in the middle of a compaction.
+
+    def __init__(self, snapshot_file, log_file, archive_file, compact_every=DEFAULT_COMPACT_EVERY):
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        self.archive_file = archive_file
+        self.compact_every = compact_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.pending_events = 0
+        self.log = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self, listener=None):
+        # listener, if given, is called with every event replayed from the log
+        history, self.seq, legacy_events = self.read_snapshot()
+        self.snapshot_seq = self.seq
+        self.pending_events = self.replay_log(history, listener)
+        self.log = open(self.log_file, "a", encoding="utf-8")
+        if legacy_events is not None:
+            # Snapshot still holds the full change lists: move them to the archive once
+            if not os.path.exists(self.archive_file):
+                self.write_archive(legacy_events)
+            self.compact(self.snapshot(history))
+        return history
+
+    def read_snapshot(self):
+        if not os.path.exists(self.snapshot_file):
+            return {}, 0, None
+        with open(self.snapshot_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == SNAPSHOT_VERSION:
+            history = {
+                item_key: {listing_id: ListingRecord.from_row(row) for listing_id, row in listings.items()}
+                for item_key, listings in data['history'].items()
+            }
+            return history, data['seq'], None
+        if "seq" in data and "history" in data:
+            history, seq = data['history'], data['seq']
+        else:
+            # Legacy history.json written before the event log existed
+            history, seq = data, 0
+        return self.convert_legacy(history), seq, self.legacy_events(history)
+
+    @staticmethod
+    def convert_legacy(legacy):
+        history = {}
+        for item_key, listings in legacy.items():
+            records = history.setdefault(item_key, {})
+            for listing_id, info in listings.items():
+                changes = info.get("changes") or [info]
+                records[listing_id] = ListingRecord(
+                    info['price'], info['float'],
+                    parse_timestamp(changes[0]['timestamp']), parse_timestamp(info['timestamp'])
+                )
+        return history
+
+    @staticmethod
+    def legacy_events(legacy):
+        events = []
+        for item_key, listings in legacy.items():
+            for listing_id, info in listings.items():
+                for idx, change in enumerate(info.get("changes") or [info]):
+                    events.append({"seq": 0, "op": "new" if idx == 0 else "change", "item": item_key,
+                                   "id": listing_id, "price": change['price'], "float": change['float'],
+                                   "timestamp": change['timestamp']})
+        events.sort(key=lambda event: event['timestamp'])
+        return events
+
+    def write_archive(self, events):
+        tmp_file = self.archive_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.archive_file)
+
+    def replay_log(self, history, listener=None):
+        if not os.path.exists(self.log_file):
+            return 0
+        replayed = 0
+        valid_size = 0
+        with open(self.log_file, "rb") as f:
+            for raw in f:
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    if raw.endswith(b"\n"):
+                        logging.warning("Skipping corrupted history event: %r", raw[:80])
+                        valid_size += len(raw)
+                        continue
+                    # Torn write from a crash: drop the partial trailing line
+                    break
+                valid_size += len(raw)
+                if event['seq'] <= self.seq:
+                    continue
+                apply_event(history, event)
+                if listener:
+                    listener(event)
+                self.seq = event['seq']
+                replayed += 1
+        if valid_size < os.path.getsize(self.log_file):
+            logging.warning("Truncating incomplete history log entry")
+            with open(self.log_file, "r+b") as f:
+                f.truncate(valid_size)
+        return replayed
+
+    def record_new(self, item_key, listing_id, price, flt, timestamp, tier=None, rates=None):
+        self.append("new", item_key, listing_id, price, flt, timestamp, tier, rates)
+
+    def record_change(self, item_key, listing_id, price, flt, timestamp, tier=None, rates=None):
+        self.append("change", item_key, listing_id, price, flt, timestamp, tier, rates)
+
+    def record_removal(self, item_key, listing_id, price, flt, timestamp):
+        self.append("remove", item_key, listing_id, price, flt, timestamp)
+
+    def append(self, op, item_key, listing_id, price, flt, timestamp, tier=None, rates=None):
+        with self.lock:
+            if self.log is None:
+                self.log = open(self.log_file, "a", encoding="utf-8")
+            self.seq += 1
+            event = {"seq": self.seq, "op": op, "item": item_key, "id": listing_id,
+                     "price": price, "float": flt, "timestamp": timestamp}
+            if tier is not None:
+                event['tier'] = tier
+            if rates:
+                # USD -> currency rates in effect when the event happened
+                event['rates'] = rates
+            self.log.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.pending_events += 1
+            self.dirty = True
+
+    def commit(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.dirty = False
+
+    def iter_events(self):
+        # Reads the archive then the log lazily, without holding the lock while
+        # iterating. Compaction replaces the log file rather than truncating it, so
+        # the handles opened here keep seeing a consistent view.
+        with self.lock:
+            if self.log:
+                self.log.flush()
+            files = []
+            for path in (self.archive_file, self.log_file):
+                if os.path.exists(path):
+                    f = open(path, "rb")
+                    files.append((f, os.fstat(f.fileno()).st_size))
+        last_seq = 0
+        for f, size in files:
+            with f:
+                read = 0
+                for raw in f:
+                    read += len(raw)
+                    if read > size:
+                        break
+                    try:
+                        event = json.loads(raw)
+                    except ValueError:
+                        continue
+                    # Events archived twice by an interrupted compaction are skipped
+                    if event['seq'] and event['seq'] <= last_seq:
+                        continue
+                    last_seq = max(last_seq, event['seq'])
+                    yield event
+
+    def needs_compaction(self):
+        return self.pending_events >= self.compact_every
+
+    def snapshot(self, history):
+        # Copy of the hot listings as of the last event, taken while the caller prevents
+        # concurrent changes to history; compact() then writes it without that lock
+        with self.lock:
+            if self.log:
+                self.log.flush()
+            return {
+                "seq": self.seq,
+                "offset": os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0,
+                "history": {
+                    item_key: {listing_id: record.to_row() for listing_id, record in listings.items()}
+                    for item_key, listings in history.items()
+                }
+            }
+
+    def compact(self, snapshot):
+        # Writes the snapshot, then moves the events it covers from the log to the
+        # archive. Events appended meanwhile stay in the log; a crash in between leaves
+        # events in both, which replay_log and iter_events skip by seq.
+        text = json.dumps({"version": SNAPSHOT_VERSION, "seq": snapshot['seq'], "history": snapshot['history']},
+                          ensure_ascii=False, separators=(",", ":"))
+        tmp_file = self.snapshot_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+        offset = snapshot['offset']
+        if offset:
+            # The log only grows, so its first offset bytes can be copied without the lock
+            with open(self.log_file, "rb") as src, open(self.archive_file, "ab") as dst:
+                remaining = offset
+                while remaining:
+                    chunk = src.read(min(remaining, COPY_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+
+        with self.lock:
+            if self.log:
+                self.log.flush()
+            tail = b""
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "rb") as src:
+                    src.seek(offset)
+                    tail = src.read()
+            if self.log:
+                self.log.close()
+            tmp_file = self.log_file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.log_file)
+            self.log = open(self.log_file, "a", encoding="utf-8")
+            self.snapshot_seq = snapshot['seq']
+            self.pending_events = tail.count(b"\n")
+            self.dirty = False
+        logging.info("History compacted (seq %d)", snapshot['seq'])
+
+    def close(self):
+        self.commit()
+        if self.log:
+            self.log.close()
@@ -1,15 +1,38 @@
-import requests
+import asyncio
 import time
-import json
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
+from coordinator import Coordinator
+from control import ControlServer, DEFAULT_CONTROL_HOST, DEFAULT_CONTROL_PORT
+from fingerprint import ResultFingerprint
+from fx import RateProvider, format_amount, DEFAULT_CURRENCY, DEFAULT_FX_TTL_HOURS, OPEN_EXCHANGE_RATES_URL
 from mapper import EmbedMapper
+from metrics import (Metrics, MetricsServer, InstrumentedLock, PollProfiler, DEFAULT_METRICS_HOST,
+                     DEFAULT_METRICS_PORT)
+from notifier import DiscordNotifier, DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS, LISTINGS_KEY
+from poller import Poller, RequestBudget, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL, DEFAULT_REQUESTS_PER_MINUTE
+from history import (EventLogStore, ListingRecord, apply_retention, DEFAULT_COMPACT_EVERY, DEFAULT_RETENTION_HOURS,
+                     DEFAULT_MAX_LISTINGS_PER_ITEM)
+from stats import StatsIndex, DEFAULT_STATS_RETENTION_DAYS
+from shard import SharedState, HashRing, shard_key, HEARTBEAT_INTERVAL
+from tiers import Tiers
+from transport import Transport, RateLimitError, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES
+from watchlist import Watchlist, group_queries, rule_label
+import signal
 import sys
 import threading
 
-DEFAULT_USD_TO_EUR = 0.866
+DEFAULT_MAX_CONCURRENCY = 8
+RETENTION_CHECK_INTERVAL = 3600
+CSFLOAT_API_URL = "https://csfloat.com/api/v1"
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGES = 10
+WATCHLIST_RELOAD_INTERVAL = 5
+DEFAULT_DIGEST_THRESHOLD = 10
+STAGE_SECONDS = "csfloat_bot_stage_seconds"
+FETCH_COUNTERS = ("polls", "pages", "listings", "seconds", "unchanged_pages", "unchanged_listings")
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,224 +41,836 @@ logging.basicConfig(
 )
 
 
+def load_environment():
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    load_dotenv(os.path.join(base_dir, '../.env'))
+    load_dotenv(os.path.join(base_dir, '../.env.secrets'), override=True)
+    return base_dir
+
+
 class CSFloatBot:
     def __init__(self):
-        if getattr(sys, 'frozen', False):
-            self.BASE_DIR = os.path.dirname(sys.executable)
-        else:
-            self.BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-        load_dotenv(os.path.join(self.BASE_DIR, '../.env'))
-        load_dotenv(os.path.join(self.BASE_DIR, '../.env.secrets'), override=True)
+        self.BASE_DIR = load_environment()
 
+        # Every file the bot writes lives in DATA_DIR
+        self.DATA_DIR = os.getenv("DATA_DIR", os.path.join(self.BASE_DIR, ".."))
         self.DISCORD_WEBHOOK = os.getenv("DISCORD_WEBHOOK")
         self.DISCORD_USER_ID = os.getenv("DISCORD_USER_ID")
         self.CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 60))
+        self.MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.MIN_INTERVAL = float(os.getenv("MIN_INTERVAL", DEFAULT_MIN_INTERVAL))
+        self.MAX_INTERVAL = float(os.getenv("MAX_INTERVAL", DEFAULT_MAX_INTERVAL))
+        self.REQUESTS_PER_MINUTE = float(os.getenv("CSFLOAT_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE))
         self.CSFLOAT_TOKEN = os.getenv("CSFLOAT_TOKEN")
+        self.CSFLOAT_LISTINGS_URL = os.getenv("CSFLOAT_API_URL", CSFLOAT_API_URL).rstrip("/") + "/listings"
+        self.PAGE_SIZE = int(os.getenv("CSFLOAT_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+        self.MAX_PAGES = int(os.getenv("CSFLOAT_MAX_PAGES", DEFAULT_MAX_PAGES))
         self.OPEN_EXCHANGE_RATES_TOKEN = os.getenv("OPEN_EXCHANGE_RATES_TOKEN")
-        self.HISTORY_FILE = os.path.join(self.BASE_DIR, "../history.json")
-        self.USD_TO_EUR = DEFAULT_USD_TO_EUR
-
-        self.ITEMS = [
-            {
-                "name": "★ M9 Bayonet | Crimson Web",
-                "def_index": 508,
-                "paint_index": 12,
-                "max_price": 1716,
-                "min_float": 0,
-                "max_float": 0.15
-            },
-            {
-                "name": "★ Karambit | Crimson Web",
-                "def_index": 507,
-                "paint_index": 12,
-                "max_price": 1716,
-                "min_float": 0,
-                "max_float": 0.15
-            },
-        ]
+        self.OPEN_EXCHANGE_RATES_URL = os.getenv("OPEN_EXCHANGE_RATES_URL", OPEN_EXCHANGE_RATES_URL)
+        # Set by the coordinator on each worker of the sharded mode (SHARD_WORKERS)
+        self.WORKER_ID = os.getenv("WORKER_ID")
+        self.SHARD_DB = os.getenv("SHARD_DB", os.path.join(self.DATA_DIR, "shard.db"))
+        self.WATCHLIST_FILE = os.getenv("WATCHLIST_FILE", os.path.join(self.DATA_DIR, "watchlist.json"))
+        self.TIERS_FILE = os.getenv("TIERS_FILE", os.path.join(self.DATA_DIR, "tiers.json"))
+        self.HISTORY_FILE = os.path.join(self.DATA_DIR, "history.json")
+        self.HISTORY_LOG_FILE = os.path.join(self.DATA_DIR, "history.log")
+        self.HISTORY_ARCHIVE_FILE = os.path.join(self.DATA_DIR, "history.archive.jsonl")
+        self.HISTORY_COMPACT_EVERY = int(os.getenv("HISTORY_COMPACT_EVERY", DEFAULT_COMPACT_EVERY))
+        self.HISTORY_RETENTION_HOURS = float(os.getenv("HISTORY_RETENTION_HOURS", DEFAULT_RETENTION_HOURS))
+        self.STATS_FILE = os.path.join(self.DATA_DIR, "stats.json")
+        self.STATS_RETENTION_DAYS = float(os.getenv("STATS_RETENTION_DAYS", DEFAULT_STATS_RETENTION_DAYS))
+        self.HISTORY_MAX_LISTINGS_PER_ITEM = int(os.getenv("HISTORY_MAX_LISTINGS_PER_ITEM",
+                                                           DEFAULT_MAX_LISTINGS_PER_ITEM))
+        # Prices are shown in CURRENCY; CURRENCIES lists every currency stats can be shown in
+        self.CURRENCY = os.getenv("CURRENCY", DEFAULT_CURRENCY).upper()
+        # A poll with more notifications than this sends them as digest embeds, 0 to disable
+        self.DIGEST_THRESHOLD = int(os.getenv("NOTIFY_DIGEST_THRESHOLD", DEFAULT_DIGEST_THRESHOLD))
+        self.CURRENCIES = [c.strip().upper() for c in os.getenv("CURRENCIES", self.CURRENCY).split(",") if c.strip()]
+        if self.CURRENCY not in self.CURRENCIES:
+            self.CURRENCIES.insert(0, self.CURRENCY)
+        self.metrics = Metrics()
+        self.METRICS_FILE = os.path.join(self.DATA_DIR, "metrics.prom")
+        self.profiler = PollProfiler(self.DATA_DIR)
+        self.metrics_server = MetricsServer(self.metrics, self.profiler,
+                                            os.getenv("METRICS_HOST", DEFAULT_METRICS_HOST),
+                                            int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT)))
+        self.control = ControlServer(os.getenv("CONTROL_HOST", DEFAULT_CONTROL_HOST),
+                                     int(os.getenv("CONTROL_PORT", DEFAULT_CONTROL_PORT)))
+        self.http = Transport(
+            pool_size=self.MAX_CONCURRENCY,
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+            retries=int(os.getenv("HTTP_RETRIES", DEFAULT_RETRIES))
+        )
 
+        # Items are read from WATCHLIST_FILE (see watchlist.example.json) and reloaded when
+        # it changes. Items on the same def_index/paint_index share a single API query.
+        self.watchlist = Watchlist(self.WATCHLIST_FILE)
+        self.ITEMS = self.watchlist.load()
+        self.QUERIES = group_queries(self.ITEMS)
+
+        self.store = EventLogStore(self.HISTORY_FILE, self.HISTORY_LOG_FILE, self.HISTORY_ARCHIVE_FILE,
+                                   self.HISTORY_COMPACT_EVERY)
+        self.notifier = DiscordNotifier(
+            self.http, self.DISCORD_WEBHOOK, self.DISCORD_USER_ID,
+            os.path.join(self.DATA_DIR, "notifications.pending.jsonl"),
+            os.path.join(self.DATA_DIR, "notifications.rejected.jsonl"),
+            queue_size=int(os.getenv("NOTIFY_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+            workers=int(os.getenv("NOTIFY_WORKERS", DEFAULT_WORKERS))
+        )
+        self.stats = StatsIndex(self.STATS_RETENTION_DAYS)
+        self.mapper = EmbedMapper(self.CURRENCY)
+        # Notifications of the poll running in the current thread, sent once it is done
+        self.poll_notifications = threading.local()
         self.history = self.load_history()
-        self.fetch_currency_exchange_rate()
-        self.lock = threading.Lock()
+        self.started = time.time()
+        self.last_retention = 0
+        self.fetch_stats = {query['name']: dict.fromkeys(FETCH_COUNTERS, 0) for query in self.QUERIES}
+        if os.path.exists(self.TIERS_FILE):
+            try:
+                Tiers.load(self.TIERS_FILE)
+            except Exception as e:
+                logging.error(f"Error loading tiers from {self.TIERS_FILE}: {e}")
+        Tiers.report_conflicts()
+        self.fingerprints = {}
+        self.fx = RateProvider(self.http, self.OPEN_EXCHANGE_RATES_TOKEN, os.path.join(self.DATA_DIR, "fx_rates.json"),
+                               self.CURRENCIES, float(os.getenv("FX_TTL_HOURS", DEFAULT_FX_TTL_HOURS)),
+                               self.OPEN_EXCHANGE_RATES_URL)
+        self.lock = InstrumentedLock(self.metrics, "history")
+        self.compaction_lock = threading.Lock()
+        self.metrics.add_collector(self.collect_metrics)
+        self.control.route("GET", "/stats", self.control_stats, blocking=True)
+        self.control.route("GET", "/listings", self.control_listings, blocking=True)
+        self.control.route("GET", "/items", self.control_items)
+        self.control.route("POST", "/pause", self.control_pause)
+        self.control.route("POST", "/resume", self.control_resume)
+        self.control.route("POST", "/poll", self.control_poll)
+        self.control.route("POST", "/reload", self.control_reload)
+        self.control.route("POST", "/metrics/dump", self.control_dump_metrics, blocking=True)
+        self.budget = RequestBudget(self.REQUESTS_PER_MINUTE)
+        self.shared = None
+        self.ring = None
+        self.shard_workers = []
+        if self.WORKER_ID:
+            self.shared = SharedState(self.SHARD_DB, self.WORKER_ID)
+            self.shard_workers = self.shared.heartbeat()
+            self.ring = HashRing(self.shard_workers)
+            self.split_budget()
+            self.notifier.on_delivered = self.shared.mark_sent
+        self.poller = Poller(self.check_item, self.owned_queries(), self.CHECK_INTERVAL, self.MAX_CONCURRENCY,
+                             self.MIN_INTERVAL, self.MAX_INTERVAL, self.observed_event_rates())
 
     def load_history(self):
-        if os.path.exists(self.HISTORY_FILE):
+        stats_loaded = False
+        if os.path.exists(self.STATS_FILE):
             try:
-                with open(self.HISTORY_FILE, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                self.stats.load(self.STATS_FILE)
+                stats_loaded = True
             except Exception as e:
-                logging.error(f"Erreur lors du chargement de l'historique : {e}")
-                return {}
-        return {}
+                logging.error(f"Error loading stats: {e}")
+        try:
+            history = self.store.load(self.stats.add_event if stats_loaded else None)
+        except Exception as e:
+            logging.error(f"Erreur lors du chargement de l'historique : {e}")
+            return {}
+        if not stats_loaded or self.stats.seq < self.store.snapshot_seq:
+            self.rebuild_stats()
+        return history
+
+    def rebuild_stats(self):
+        # One full pass over the archive, only needed when stats.json is missing or stale
+        logging.info("Rebuilding stats from history...")
+        item_queries = self.stats.item_queries
+        self.stats = StatsIndex(self.STATS_RETENTION_DAYS)
+        self.stats.item_queries = item_queries
+        for event in self.store.iter_events():
+            try:
+                self.stats.add_event(event)
+            except Exception:
+                continue
+        self.stats.prune(time.time())
+        self.stats.save(self.STATS_FILE, self.store.seq)
 
     def save_history(self):
-        with open(self.HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.history, f, indent=2, ensure_ascii=False)
+        # Called once per poll: makes the events appended since the last call durable
+        with self.metrics.timer(STAGE_SECONDS, stage="save_history"):
+            self.persist_history()
 
-    def fetch_currency_exchange_rate(self):
-        if not self.OPEN_EXCHANGE_RATES_TOKEN:
-            logging.warning("OPEN_EXCHANGE_RATES_TOKEN not set, using default rate.")
-            self.USD_TO_EUR = DEFAULT_USD_TO_EUR
-            return
+    def persist_history(self):
         try:
-            url = f"https://openexchangerates.org/api/latest.json?app_id={self.OPEN_EXCHANGE_RATES_TOKEN}"
-            r = requests.get(url)
-            data = r.json()
-            self.USD_TO_EUR = data['rates']['EUR']
+            self.store.commit()
+            now = time.time()
+            if now - self.last_retention >= RETENTION_CHECK_INTERVAL:
+                self.last_retention = now
+                # Listings still returned by the API are never evicted, even when unchanged
+                active = {str(listing_id) for fingerprint in list(self.fingerprints.values())
+                          for listing_id in fingerprint.prices}
+                with self.lock:
+                    for item_key in self.unpolled_item_keys(now):
+                        active.update(self.history.get(item_key, ()))
+                    evicted = apply_retention(self.history, self.HISTORY_RETENTION_HOURS * 3600,
+                                              self.HISTORY_MAX_LISTINGS_PER_ITEM, now, active)
+                if evicted:
+                    logging.info("Archived %d listing(s) from memory", evicted)
+                self.stats.prune(now)
+                if self.shared is not None:
+                    self.shared.touch(active, now)
+                    self.shared.prune(now - self.HISTORY_RETENTION_HOURS * 3600)
+            if self.store.needs_compaction() and self.compaction_lock.acquire(blocking=False):
+                # Only the copies are taken under the history lock, polls keep going
+                # while they are written
+                try:
+                    with self.lock:
+                        snapshot = self.store.snapshot(self.history)
+                        stats = self.stats.snapshot(snapshot['seq'])
+                    self.store.compact(snapshot)
+                    self.stats.write(self.STATS_FILE, stats)
+                finally:
+                    self.compaction_lock.release()
         except Exception as e:
-            logging.error(f"Error fetching exchange rate: {e}")
+            logging.error(f"Error saving history: {e}")
 
-    def send_discord_message(self, message: str, embed: dict = None):
-        if self.DISCORD_WEBHOOK:
+    def unpolled_item_keys(self, now):
+        # After a restart, the listings of the queries not polled yet would all look stale.
+        # They are kept until their own query has been polled, so that a query that keeps
+        # failing (or is paused) never holds up the retention of the others. Items not
+        # mapped to a query yet are kept for MAX_INTERVAL after startup.
+        unpolled = {shard_key(query) for query in self.owned_queries() if query['name'] not in self.fingerprints}
+        item_queries = self.stats.queries_of()
+        keep_unmapped = now - self.started < self.MAX_INTERVAL
+        return [item_key for item_key in self.history
+                if item_queries.get(item_key) in unpolled or (keep_unmapped and item_key not in item_queries)]
+
+    def reload_watchlist(self):
+        try:
+            items = self.watchlist.load()
+        except Exception as e:
+            logging.error(f"Error loading watchlist {self.WATCHLIST_FILE}, keeping the current one: {e}")
+            return
+        queries = group_queries(items)
+        for query in queries:
+            self.fetch_stats.setdefault(query['name'], dict.fromkeys(FETCH_COUNTERS, 0))
+        # A fingerprint only holds for the rules it was taken with: listings the former
+        # rules rejected would be skipped as unchanged
+        rules = {query['name']: [rule for rule, _ in query['rules']] for query in queries}
+        previous_rules = {query['name']: [rule for rule, _ in query['rules']] for query in self.QUERIES}
+        for name in list(self.fingerprints):
+            if rules.get(name) != previous_rules.get(name):
+                del self.fingerprints[name]
+        self.ITEMS = items
+        self.QUERIES = queries
+        self.poller.update(self.owned_queries(), self.observed_event_rates())
+        logging.info("Watchlist reloaded: %d item(s) in %d queries", len(items), len(queries))
+
+    def owned_queries(self):
+        if self.ring is None:
+            return self.QUERIES
+        return [query for query in self.QUERIES if self.ring.owner(shard_key(query)) == self.WORKER_ID]
+
+    def split_budget(self):
+        # Workers share one host and IP: each gets its share of the requests/minute
+        self.budget.set_rate(self.REQUESTS_PER_MINUTE / max(1, len(self.shard_workers)))
+
+    async def watch_shard(self):
+        # Heartbeats keep this worker in the membership; the items are reassigned when
+        # a worker joins or leaves
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
             try:
-                payload = {"content": f"<@{self.DISCORD_USER_ID}>\n" if self.DISCORD_USER_ID else ""}
-                if embed:
-                    payload['embeds'] = [embed]
-                else:
-                    payload['content'] += message
-                requests.post(self.DISCORD_WEBHOOK, json=payload)
+                workers = await loop.run_in_executor(None, self.shared.heartbeat)
             except Exception as e:
-                logging.error(f"Error sending to Discord: {e}")
+                logging.error(f"Error updating the shard membership: {e}")
+                continue
+            if workers == self.shard_workers:
+                continue
+            self.shard_workers = workers
+            self.ring = HashRing(workers)
+            self.split_budget()
+            queries = self.owned_queries()
+            names = {query['name'] for query in queries}
+            for name in list(self.fingerprints):
+                if name not in names:
+                    del self.fingerprints[name]
+            self.poller.update(queries, self.observed_event_rates())
+            logging.info("Shard rebalanced over %d worker(s): polling %d of %d queries", len(workers),
+                         len(queries), len(self.QUERIES))
+
+    async def watch_watchlist(self):
+        while True:
+            await asyncio.sleep(WATCHLIST_RELOAD_INTERVAL)
+            if self.watchlist.changed():
+                self.reload_watchlist()
+
+    def send_discord_message(self, message: str, embed: dict = None):
+        # Only queues the message: it is posted by the notifier workers
+        with self.metrics.timer(STAGE_SECONDS, stage="send_discord_message"):
+            self.notifier.enqueue(embed if embed else {"description": message})
+
+    def notify(self, listing, prev_price=None):
+        notifications = getattr(self.poll_notifications, "events", None)
+        if notifications is not None:
+            notifications.append((listing, prev_price))
         else:
-            logging.warning("DISCORD_WEBHOOK not set, message not sent.")
+            self.send_notifications([(listing, prev_price)])
 
-    def fetch_csfloat_data(self, item):
-        url = (
-            "https://csfloat.com/api/v1/listings?"
-            f"sort_by=lowest_price&min_float={item['min_float']}&max_float={item['max_float']}&def_index={item['def_index']}&paint_index={item['paint_index']}&type=buy_now"
-        )
+    def send_notifications(self, notifications):
+        if not notifications:
+            return
+        rate = self.fx.rate(self.CURRENCY)
+        # In sharded mode each embed carries its listings, marked sent once it is delivered
+        extra = self.delivery_keys if self.shared is not None else None
+        with self.metrics.timer(STAGE_SECONDS, stage="render_embeds"):
+            if self.DIGEST_THRESHOLD and len(notifications) > self.DIGEST_THRESHOLD:
+                embeds = self.mapper.map_to_digest(notifications, rate, extra)
+            else:
+                embeds = [self.mapper.map_to_new_offer(listing, rate) if prev_price is None
+                          else self.mapper.map_to_edited_offer(prev_price, listing, rate)
+                          for listing, prev_price in notifications]
+                if extra is not None:
+                    for embed, notification in zip(embeds, notifications):
+                        embed.update(extra([notification]))
+        for embed in embeds:
+            self.send_discord_message("", embed)
+
+    @staticmethod
+    def delivery_keys(notifications):
+        return {LISTINGS_KEY: [(str(listing['id']), listing['price'] / 100) for listing, _ in notifications]}
+
+    def recover_notifications(self):
+        # Claims left unsent when this worker last stopped (those still in the pending
+        # file are retried by the notifier itself)
+        notifications = self.shared.unsent_claims(self.notifier.pending_listings())
+        if notifications:
+            logging.warning("Resending %d notification(s) claimed but not delivered before the restart",
+                            len(notifications))
+            self.send_notifications(notifications)
+
+    def fetch_csfloat_data(self, item, cursor=None):
+        params = {
+            "sort_by": "lowest_price",
+            "min_float": item['min_float'],
+            "max_float": item['max_float'],
+            "def_index": item['def_index'],
+            "paint_index": item['paint_index'],
+            "type": "buy_now",
+            "limit": item.get("page_size", self.PAGE_SIZE),
+        }
+        params.update(item['filter'].query_params())
+        if cursor:
+            params['cursor'] = cursor
         headers = {}
         if self.CSFLOAT_TOKEN:
             headers['Authorization'] = self.CSFLOAT_TOKEN
         else:
             raise Exception("CSFLOAT_TOKEN not set")
-        r = requests.get(url, headers=headers)
+        self.metrics.observe(STAGE_SECONDS, self.budget.acquire(), stage="budget_wait", item=item['name'])
+        try:
+            with self.metrics.timer(STAGE_SECONDS, stage="fetch", item=item['name']):
+                r = self.http.get(self.CSFLOAT_LISTINGS_URL, params=params, headers=headers)
+        except Exception as e:
+            self.metrics.inc("csfloat_bot_api_errors_total", code=type(e).__name__)
+            raise
+        if r.status_code != 200:
+            self.metrics.inc("csfloat_bot_api_errors_total", code=f"http_{r.status_code}")
+        if r.status_code == 429:
+            retry_after = float(r.headers.get("Retry-After", 0)) or None
+            self.budget.block(retry_after or self.MIN_INTERVAL)
+            raise RateLimitError("CSFloat rate limit reached", retry_after)
         data = r.json()
         if data.get("code") == 1:
+            self.metrics.inc("csfloat_bot_api_errors_total", code="api_1")
             raise Exception(data.get("message"))
         return data
 
-    def process_listing(self, listing):
+    def fetch_csfloat_listing(self, item, listing_id):
+        # Returns the listing, or None once it is sold or delisted
+        if not self.CSFLOAT_TOKEN:
+            raise Exception("CSFLOAT_TOKEN not set")
+        self.metrics.observe(STAGE_SECONDS, self.budget.acquire(), stage="budget_wait", item=item['name'])
+        try:
+            with self.metrics.timer(STAGE_SECONDS, stage="fetch_listing", item=item['name']):
+                r = self.http.get(f"{self.CSFLOAT_LISTINGS_URL}/{listing_id}",
+                                  headers={"Authorization": self.CSFLOAT_TOKEN})
+        except Exception as e:
+            self.metrics.inc("csfloat_bot_api_errors_total", code=type(e).__name__)
+            raise
+        if r.status_code == 404:
+            return None
+        if r.status_code != 200:
+            self.metrics.inc("csfloat_bot_api_errors_total", code=f"http_{r.status_code}")
+        if r.status_code == 429:
+            retry_after = float(r.headers.get("Retry-After", 0)) or None
+            self.budget.block(retry_after or self.MIN_INTERVAL)
+            raise RateLimitError("CSFloat rate limit reached", retry_after)
+        if r.status_code != 200:
+            raise Exception(f"HTTP {r.status_code}")
+        listing = r.json()
+        return listing if listing.get("state", "listed") == "listed" else None
+
+    def iter_csfloat_pages(self, item):
+        # Follows the pagination cursor and yields (listings, last) as pages arrive, last
+        # being True once the whole result set has been read. Results are sorted by
+        # lowest price, so we stop at the first listing above max_price.
+        max_price = item.get("max_price")
+        stats = self.fetch_stats[item['name']]
+        stats['polls'] += 1
+        cursor = None
+        for _ in range(self.MAX_PAGES):
+            started = time.perf_counter()
+            data = self.fetch_csfloat_data(item, cursor)
+            listings = data.get("data", [])
+            stats['pages'] += 1
+            stats['listings'] += len(listings)
+            stats['seconds'] += time.perf_counter() - started
+            if max_price is not None:
+                for idx, listing in enumerate(listings):
+                    if listing['price'] / 100 > max_price:
+                        yield listings[:idx], True
+                        return
+            cursor = data.get("cursor")
+            last = not cursor or not listings
+            yield listings, last
+            if last:
+                return
+        logging.warning("Stopped fetching %s after %d pages", item['name'], self.MAX_PAGES)
+
+    def process_listing(self, listing, notify=True):
+        # Returns True when the listing produced a history event. With notify False, only
+        # the price of a known listing is updated.
         item_key = listing['item']['market_hash_name']
-        with self.lock:
+        with self.metrics.timer(STAGE_SECONDS, stage="process_listing", item=item_key), self.lock:
             if item_key not in self.history:
                 self.history[item_key] = {}
+            if not notify and str(listing['id']) not in self.history[item_key]:
+                return False
+            if self.shared is not None:
+                return self.process_shared_listing(item_key, listing, notify)
             if str(listing['id']) not in self.history[item_key]:
                 self.handle_new_listing(item_key, listing)
+                return True
             else:
-                self.handle_existing_listing(item_key, listing)
+                return self.handle_existing_listing(item_key, listing, notify)
+
+    def process_shared_listing(self, item_key, listing, notify=True):
+        # The shared state decides which worker notifies a listing; the local history
+        # catches up with changes notified by another worker (e.g. before a rebalance)
+        listing_id = str(listing['id'])
+        price_usd = listing['price'] / 100
+        op, previous_price = self.shared.claim(listing_id, item_key, price_usd, listing if notify else None)
+        if op == "new" and notify:
+            self.handle_new_listing(item_key, listing)
+            return True
+        prev = self.history[item_key].get(listing_id)
+        if prev is None:
+            prev = self.history[item_key][listing_id] = ListingRecord(previous_price, listing['item']['float_value'],
+                                                                      time.time())
+        if op == "change":
+            prev.price = previous_price
+            return self.handle_existing_listing(item_key, listing, notify)
+        prev.price = price_usd
+        prev.last_seen = time.time()
+        return False
 
     def handle_new_listing(self, item_key, listing):
-        now = datetime.now().isoformat()
+        now = datetime.now()
         listing_id = str(listing['id'])
         price_usd = listing['price'] / 100
-        price_eur = price_usd * self.USD_TO_EUR
+        rate = self.fx.rate(self.CURRENCY)
+        rates = self.fx.snapshot()
         flt = listing['item']['float_value']
-        self.history[item_key][listing_id] = {
-            "price": price_usd,
-            "float": flt,
-            "timestamp": now,
-            "changes": [
-                {"price": price_usd, "float": flt, "timestamp": now}
-            ]
-        }
-        embed = EmbedMapper.map_to_new_offer(listing, self.USD_TO_EUR)
-        logging.info("New offer: %s at %.2f€ (float %.6f)", listing['item']['market_hash_name'], price_eur, flt)
-        self.send_discord_message("", embed)
-        self.save_history()
+        tier = self.mapper.tier(listing)
+        self.history[item_key][listing_id] = ListingRecord(price_usd, flt, now.timestamp())
+        self.store.record_new(item_key, listing_id, price_usd, flt, now.isoformat(), tier, rates)
+        self.stats.add(item_key, "new", price_usd, flt, now.timestamp(), tier, rates)
+        self.metrics.inc("csfloat_bot_listing_events_total", event="new", item=item_key)
+        logging.info("New offer: %s at %s (float %.6f)", listing['item']['market_hash_name'],
+                     format_amount(price_usd * rate, self.CURRENCY), flt)
+        self.notify(listing)
 
-    def handle_existing_listing(self, item_key, listing):
+    def handle_existing_listing(self, item_key, listing, notify=True):
         listing_id = str(listing['id'])
         price_usd = listing['price'] / 100
-        price_eur = price_usd * self.USD_TO_EUR
         flt = listing['item']['float_value']
         prev = self.history[item_key][listing_id]
-        if prev['price'] != price_usd:
-            now = datetime.now().isoformat()
-            embed = EmbedMapper.map_to_edited_offer(prev, listing, self.USD_TO_EUR)
-            logging.info("Price change: %s to %.2f€ (float %.6f)", listing['item']['market_hash_name'], price_eur, flt)
-            self.send_discord_message("", embed)
-            prev['changes'].append({"price": price_usd, "float": flt, "timestamp": now})
-            prev['price'] = price_usd
-            prev['float'] = flt
-            prev['timestamp'] = now
-            self.save_history()
+        now = datetime.now()
+        prev.last_seen = now.timestamp()
+        if prev.price != price_usd:
+            rate = self.fx.rate(self.CURRENCY)
+            rates = self.fx.snapshot()
+            logging.info("Price change: %s to %s (float %.6f)", listing['item']['market_hash_name'],
+                         format_amount(price_usd * rate, self.CURRENCY), flt)
+            if notify:
+                self.notify(listing, prev.price)
+            prev.price = price_usd
+            prev.float = flt
+            prev.timestamp = prev.last_seen
+            tier = self.mapper.tier(listing)
+            self.store.record_change(item_key, listing_id, price_usd, flt, now.isoformat(), tier, rates)
+            self.stats.add(item_key, "change", price_usd, flt, prev.timestamp, tier, rates)
+            self.metrics.inc("csfloat_bot_listing_events_total", event="repriced", item=item_key)
+            return True
+        return False
+
+    def touch_listings(self, listings):
+        # Skipped listings are still listed: refresh last_seen so that retention keeps them
+        if not listings:
+            return
+        now = time.time()
+        with self.lock:
+            for listing in listings:
+                record = self.history.get(listing['item']['market_hash_name'], {}).get(str(listing['id']))
+                if record is not None:
+                    record.last_seen = now
+
+    def process_removal(self, listing_id):
+        listing_id = str(listing_id)
+        with self.lock:
+            for item_key, listings in self.history.items():
+                prev = listings.pop(listing_id, None)
+                if prev is not None:
+                    break
+            else:
+                return False
+            now = datetime.now()
+            self.store.record_removal(item_key, listing_id, prev.price, prev.float, now.isoformat())
+            self.stats.add(item_key, "remove", prev.price, prev.float, now.timestamp())
+            self.metrics.inc("csfloat_bot_listing_events_total", event="removed", item=item_key)
+            if self.shared is not None:
+                self.shared.release(listing_id)
+        logging.info("Listing removed (sold or delisted): %s at %s (float %.6f)", item_key,
+                     format_amount(prev.price * self.fx.rate(self.CURRENCY), self.CURRENCY), prev.float)
+        return True
 
     def check_item(self, item):
+        with self.profiler.profile(item['name']), self.metrics.timer(STAGE_SECONDS, stage="poll", item=item['name']):
+            return self.poll_query(item)
+
+    def poll_query(self, item):
+        # Only listings that were added or repriced since the previous poll are processed;
+        # listings that disappeared from a complete result set are recorded as removed
+        # (unless the query has price bounds, see below).
+        # item is a grouped query: a listing is processed once if any of its rules accepts it.
+        # Returns the number of history events, errors are raised to the poller.
+        rules = item['rules']
+        stats = self.fetch_stats[item['name']]
+        previous = self.fingerprints.get(item['name'])
+        current = ResultFingerprint()
+        unchanged = []
+        item_keys = set()
+        events = 0
+        self.poll_notifications.events = []
         try:
-            data = self.fetch_csfloat_data(item)
-            for listing in data.get("data", []):
-                self.process_listing(listing)
+            for idx, (listings, last) in enumerate(self.iter_csfloat_pages(item)):
+                page = current.add_page(listings)
+                current.complete = last
+                item_keys.update(listing['item']['market_hash_name'] for listing in listings)
+                if previous is not None and previous.page_unchanged(idx, page):
+                    stats['unchanged_pages'] += 1
+                    unchanged.extend(listings)
+                    continue
+                for listing in listings:
+                    if previous is not None and previous.listing_unchanged(listing):
+                        stats['unchanged_listings'] += 1
+                        unchanged.append(listing)
+                        continue
+                    # Every rule sees the listing so that each keeps accurate filter counters
+                    if any([rule_filter.accept(listing) for _, rule_filter in rules]) \
+                            and self.process_listing(listing):
+                        events += 1
+            self.touch_listings(unchanged)
+            self.stats.link(shard_key(item), item_keys)
+            if previous is not None and current.complete:
+                bounded = self.price_bounded(item)
+                for listing_id in previous.removed(current):
+                    if bounded:
+                        events += self.process_departure(item, listing_id)
+                    elif self.process_removal(listing_id):
+                        events += 1
+            # Unless a reload changed the query while it was polled
+            schedule = self.poller.schedules.get(item['name'])
+            if schedule is not None and schedule.item is item:
+                self.fingerprints[item['name']] = current
+        finally:
+            notifications = self.poll_notifications.events
+            self.poll_notifications.events = None
+            self.send_notifications(notifications)
+            self.save_history()
+        return events
+
+    def process_departure(self, item, listing_id):
+        # With price bounds sent to the API, a listing also leaves the results when it is
+        # repriced outside them: it is looked up before being recorded as removed, and a
+        # reprice is recorded without notification (the listing no longer matches).
+        # Returns the number of history events.
+        try:
+            listing = self.fetch_csfloat_listing(item, listing_id)
+        except RateLimitError:
+            raise
         except Exception as e:
-            logging.error(f"Error: {e}")
+            logging.warning(f"Could not check whether listing {listing_id} of {item['name']} is still listed: {e}")
+            return 0
+        if listing is None:
+            return 1 if self.process_removal(listing_id) else 0
+        notify = any([rule_filter.accept(listing) for _, rule_filter in item['rules']])
+        return 1 if self.process_listing(listing, notify) else 0
 
-    def stats_message(self, period_hours=24):
-        now = datetime.now()
-        since = now - timedelta(hours=period_hours)
+    @staticmethod
+    def price_bounded(item):
+        return item.get("min_price") is not None or item.get("max_price") is not None
+
+    def observed_event_rates(self, hours=24):
+        # Seeds the adaptive intervals with each item's event rate (events/s) over the
+        # last day of recorded history; items without any history start at CHECK_INTERVAL.
+        # Stats are keyed by market_hash_name, mapped to queries as their listings are seen.
+        until = time.time()
+        since = until - hours * 3600
+        query_items = self.stats.query_items()
+        rates = {}
+        for query in self.QUERIES:
+            matching = query_items.get(shard_key(query))
+            if not matching:
+                continue
+            events = 0
+            for item_key in matching:
+                summary = self.stats.summary(item_key, since, until)
+                events += summary['new_offers'] + summary['price_changes'] + summary['removed']
+            rates[query['name']] = events / (hours * 3600)
+        return rates
+
+    def stats_message(self, period_hours=24, currency=None):
+        with self.metrics.timer(STAGE_SECONDS, stage="stats_message"):
+            return self.build_stats_message(period_hours, currency)
+
+    def build_stats_message(self, period_hours=24, currency=None):
+        # Windows are answered from hourly buckets, so they are rounded to whole hours
+        currency = (currency or self.CURRENCY).upper()
+        rate = self.fx.rate(currency)
+        until = time.time()
+        since = until - period_hours * 3600
         new_offers = 0
         price_changes = 0
-        min_prices = {}
+        removed = 0
+        lines = []
+        # Stats are keyed by market_hash_name (one per wear) rather than by watchlist item
+        for item_key in sorted(self.stats.item_keys()):
+            summary = self.stats.summary(item_key, since, until, currency, rate)
+            new_offers += summary['new_offers']
+            price_changes += summary['price_changes']
+            removed += summary['removed']
+            if summary['min_price'] is not None:
+                lines.append(f"- Lowest offer for {item_key}: {format_amount(summary['min_price'], currency)} "
+                             f"(float {summary['min_float']})\n")
+            percentiles = self.stats.percentiles(item_key, since, until, (50, 90), currency, rate)
+            for tier, values in sorted(percentiles.items(), key=lambda kv: (kv[0] is None, kv[0] or "")):
+                lines.append(f"  - {tier or 'No tier'}: median {format_amount(values[50], currency)}, "
+                             f"p90 {format_amount(values[90], currency)}\n")
 
-        with self.lock:
-            for item in self.ITEMS:
-                item_key = item['name']
-                min_price = None
-                min_float = None
-                for listing_id, info in self.history.get(item_key, {}).items():
-                    # Compute new offers
-                    try:
-                        ts = datetime.fromisoformat(info['timestamp'])
-                    except Exception:
-                        continue
-                    if ts >= since:
-                        new_offers += 1
-                        price_eur = info['price'] * self.USD_TO_EUR
-                        if min_price is None or price_eur < min_price:
-                            min_price = price_eur
-                            min_float = info['float']
-                    # Count price changes (excluding initial creation)
-                    for idx, change in enumerate(info.get("changes", [])):
-                        if idx == 0:
-                            continue  # Skip initial entry
-                        try:
-                            cts = datetime.fromisoformat(change['timestamp'])
-                        except Exception:
-                            continue
-                        if cts >= since:
-                            price_changes += 1
-                if min_price is not None:
-                    min_prices[item_key] = (min_price, min_float)
-
-        msg = f"📊 **Stats for the last {period_hours}h**\n"
+        msg = f"📊 **Stats for the last {period_hours:g}h**\n"
         msg += f"- New offers detected: {new_offers}\n"
         msg += f"- Price changes: {price_changes}\n"
-        for item in self.ITEMS:
-            item_key = item['name']
-            if item_key in min_prices:
-                price, flt = min_prices[item_key]
-                msg += f"- Lowest offer for {item_key}: {price:.2f}€ (float {flt})\n"
+        msg += f"- Removed (sold or delisted): {removed}\n"
+        msg += "".join(lines)
+        for schedule in list(self.poller.schedules.values()):
+            rate = f", {schedule.event_rate * 3600:.1f} events/h" if schedule.event_rate is not None else ""
+            mode = "adaptive" if schedule.adaptive else "fixed"
+            msg += f"- Poll {schedule.item['name']}: every {schedule.interval:.0f}s ({mode}{rate})\n"
+        for item_key, fetch in list(self.fetch_stats.items()):
+            if fetch['pages']:
+                msg += (f"- Fetch {item_key}: {fetch['pages'] / fetch['polls']:.1f} pages/poll, "
+                        f"{fetch['listings'] / fetch['pages']:.1f} listings/page, "
+                        f"{fetch['seconds'] / fetch['pages'] * 1000:.0f}ms/page, "
+                        f"{fetch['unchanged_pages']} unchanged pages and {fetch['unchanged_listings']} "
+                        f"unchanged listings skipped\n")
+        for query in self.QUERIES:
+            for rule, listing_filter in query['rules']:
+                counters = listing_filter.counters
+                rejected = ", ".join(f"{stage[len('rejected_'):]} {count}" for stage, count in counters.items()
+                                     if stage.startswith("rejected_"))
+                msg += (f"- Filter {rule_label(rule)}: {counters['received']} received, "
+                        f"{counters['accepted']} accepted (rejected: {rejected})\n")
+        notifications = self.notifier.stats()
+        msg += (f"- Notifications: {notifications['queue_depth']} queued (max {notifications['max_depth']}), "
+                f"{notifications['sent_embeds']} sent in {notifications['sent_messages']} messages, "
+                f"{notifications['rate_limited']} rate limited, {notifications['spilled']} spilled to disk, "
+                f"{notifications['failed']} failed and {notifications['rejected']} rejected batches\n")
+        for host, counters in self.http.stats().items():
+            msg += (f"- HTTP {host}: {counters['requests']} requests, "
+                    f"{counters['new_connections']} new / {counters['reused_connections']} reused connections\n")
         return msg
 
-    def stats_listener(self):
-        import msvcrt  # Windows only
-        while True:
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-                if key in (b's', b'S'):
-                    print("\n" + self.stats_message())
-            time.sleep(0.1)
+    def collect_metrics(self):
+        with self.lock:
+            history_sizes = {item_key: len(listings) for item_key, listings in self.history.items()}
+        for item_key, size in history_sizes.items():
+            yield "csfloat_bot_history_listings", "gauge", {"item": item_key}, size
+        yield "csfloat_bot_history_events_total", "counter", {}, self.store.seq
+        yield "csfloat_bot_history_log_events", "gauge", {}, self.store.pending_events
+        for item_key, fetch in list(self.fetch_stats.items()):
+            yield "csfloat_bot_polls_total", "counter", {"item": item_key}, fetch['polls']
+            yield "csfloat_bot_pages_total", "counter", {"item": item_key}, fetch['pages']
+            yield "csfloat_bot_listings_seen_total", "counter", {"item": item_key}, fetch['listings']
+            yield "csfloat_bot_unchanged_pages_total", "counter", {"item": item_key}, fetch['unchanged_pages']
+            yield "csfloat_bot_unchanged_listings_total", "counter", {"item": item_key}, fetch['unchanged_listings']
+        for schedule in list(self.poller.schedules.values()):
+            yield "csfloat_bot_poll_interval_seconds", "gauge", {"item": schedule.item['name']}, schedule.interval
+        for query in self.QUERIES:
+            for rule, listing_filter in query['rules']:
+                for stage, count in listing_filter.counters.items():
+                    labels = {"rule": rule_label(rule), "stage": stage}
+                    yield "csfloat_bot_filter_listings_total", "counter", labels, count
+        notifications = self.notifier.stats()
+        yield "csfloat_bot_notification_queue_depth", "gauge", {}, notifications['queue_depth']
+        yield "csfloat_bot_notification_queue_max_depth", "gauge", {}, notifications['max_depth']
+        for counter in ("enqueued", "spilled", "sent_messages", "sent_embeds", "rate_limited", "retries", "failed",
+                        "rejected"):
+            yield f"csfloat_bot_notifications_{counter}_total", "counter", {}, notifications[counter]
+        for host, counters in self.http.stats().items():
+            for counter, value in counters.items():
+                yield f"csfloat_bot_http_{counter}_total", "counter", {"host": host}, value
+
+    def dump_metrics(self, *args):
+        try:
+            self.metrics.dump(self.METRICS_FILE)
+            logging.info("Metrics written to %s", self.METRICS_FILE)
+        except Exception as e:
+            logging.error(f"Error writing metrics: {e}")
+
+    def control_stats(self, params):
+        hours = float(params.get("hours", 24))
+        if hours <= 0:
+            raise ValueError("hours must be positive")
+        currency = params.get("currency", self.CURRENCY).upper()
+        if currency not in self.CURRENCIES and currency != "USD":
+            raise ValueError(f"Unknown currency {currency}, expected one of {', '.join(self.CURRENCIES)}")
+        if not self.fx.has_rate(currency):
+            raise ValueError(f"No exchange rate available for {currency}")
+        return self.stats_message(hours, currency)
+
+    def control_listings(self, params):
+        # Listings currently tracked in memory, optionally only those of items containing "item"
+        item = params.get("item", "")
+        with self.lock:
+            return {
+                item_key: {
+                    listing_id: {
+                        "price": record.price,
+                        "float": record.float,
+                        "first_seen": datetime.fromtimestamp(record.first_seen).isoformat(timespec="seconds"),
+                        "updated": datetime.fromtimestamp(record.timestamp).isoformat(timespec="seconds"),
+                        "last_seen": datetime.fromtimestamp(record.last_seen).isoformat(timespec="seconds"),
+                    }
+                    for listing_id, record in listings.items()
+                }
+                for item_key, listings in self.history.items() if item in item_key
+            }
+
+    def control_targets(self, params):
+        # The "item" parameter selects one query by name, all of them when omitted
+        if "item" in params:
+            return [self.poller.schedule(params['item']).item['name']]
+        return list(self.poller.schedules)
+
+    def control_items(self, params, names=None):
+        now = asyncio.get_running_loop().time()
+        items = []
+        for name in names or list(self.poller.schedules):
+            schedule = self.poller.schedule(name)
+            items.append({
+                "name": name,
+                "rules": [rule_label(rule) for rule, _ in schedule.item['rules']],
+                "paused": schedule.paused,
+                "adaptive": schedule.adaptive,
+                "interval": schedule.interval,
+                "events_per_hour": schedule.event_rate * 3600 if schedule.event_rate is not None else None,
+                "failures": schedule.failures,
+                "next_poll_in": max(0.0, schedule.next_run - now) if schedule.next_run is not None else None,
+                "last_duration": schedule.last_duration,
+            })
+        return items
+
+    def control_pause(self, params):
+        names = self.control_targets(params)
+        for name in names:
+            self.poller.pause(name)
+        logging.info("Paused %s", ", ".join(names))
+        return self.control_items(params, names)
+
+    def control_resume(self, params):
+        names = self.control_targets(params)
+        for name in names:
+            self.poller.resume(name)
+        logging.info("Resumed %s", ", ".join(names))
+        return self.control_items(params, names)
+
+    def control_poll(self, params):
+        names = self.control_targets(params)
+        for name in names:
+            self.poller.poll_now(name)
+        return self.control_items(params, names)
+
+    def control_reload(self, params):
+        self.reload_watchlist()
+        return self.control_items(params)
+
+    def control_dump_metrics(self, params):
+        self.dump_metrics()
+        return f"Metrics written to {self.METRICS_FILE}\n"
+
+    def start_fx(self):
+        self.fx.start()
+        if not self.fx.has_rate(self.CURRENCY):
+            # Never show prices with a made-up rate
+            logging.error("No exchange rate available for %s (check OPEN_EXCHANGE_RATES_TOKEN), showing prices "
+                          "in USD instead", self.CURRENCY)
+            self.CURRENCY = "USD"
+            self.mapper = EmbedMapper(self.CURRENCY)
+
+    async def poll(self):
+        await self.control.start()
+        tasks = [self.poller.run(), self.watch_watchlist()]
+        if self.shared is not None:
+            tasks.append(self.watch_shard())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await self.control.stop()
 
     def run(self):
         logging.info("Bot started...\n")
-        threading.Thread(target=self.stats_listener, daemon=True).start()
-        while True:
-            logging.info("⏰ Checking at: %s", datetime.now().strftime("%H:%M"))
-            for item in self.ITEMS:
-                self.check_item(item)
-            time.sleep(self.CHECK_INTERVAL)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self.dump_metrics)
+        # Lets the coordinator stop a worker cleanly
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        self.metrics_server.start()
+        self.start_fx()
+        if self.shared is not None:
+            self.recover_notifications()
+        self.notifier.start()
+        try:
+            asyncio.run(self.poll())
+        finally:
+            self.notifier.stop()
+            self.metrics_server.stop()
+            self.store.close()
+            if self.shared is not None:
+                self.shared.leave()
+                self.shared.close()
 
 
 if __name__ == "__main__":
-    bot = CSFloatBot()
-    bot.run()
+    base_dir = load_environment()
+    workers = int(os.getenv("SHARD_WORKERS", 0))
+    if workers > 0 and not os.getenv("WORKER_ID"):
+        data_dir = os.getenv("DATA_DIR", os.path.join(base_dir, ".."))
+        command = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+        Coordinator(command, workers, data_dir, os.getenv("SHARD_DB", os.path.join(data_dir, "shard.db")),
+                    int(os.getenv("CONTROL_PORT", DEFAULT_CONTROL_PORT)),
+                    int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT))).run()
+    else:
+        bot = CSFloatBot()
+        bot.run()
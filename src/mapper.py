@@ -1,106 +1,135 @@
+from fx import CURRENCY_SYMBOLS
 from tiers import Tiers
 
+ITEM_URL = "https://csfloat.com/item/"
+NEW_OFFER_TITLE = "🆕 New offer detected!"
+NEW_OFFER_COLOR = 0x2ecc71
+EDITED_OFFER_TITLE = "🔄 Price change detected!"
+DECREASE_COLOR = 0x27ae60  # Green
+INCREASE_COLOR = 0xe67e22  # Orange
+DIGEST_COLOR = 0x3498db
+# Discord limits an embed description to 4096 characters
+DIGEST_MAX_CHARS = 4000
+
 
 class EmbedMapper:
+    # Renders the notification embeds in one currency, one embed per event or many
+    # events per digest embed
+
+    def __init__(self, currency="EUR"):
+        self.currency = currency
+        # Same output as fx.format_amount, without a symbol lookup per amount
+        self.suffix = CURRENCY_SYMBOLS.get(currency, " " + currency)
+
     @staticmethod
-    def map_to_new_offer(listing, usd_to_eur):
-        listing_id = str(listing['id'])
-        price_usd = listing['price'] / 100
-        price_eur = price_usd * usd_to_eur
-        flt = listing['item']['float_value']
+    def tier(listing):
+        return Tiers.determine(listing['item']['def_index'], listing['item'].get("paint_seed"))
+
+    def add_details(self, fields, listing):
+        tier = self.tier(listing)
+        if tier is not None:
+            fields.append({"name": "🏅 Tier", "value": f"{tier}", "inline": True})
         note = listing.get("description")
-        tier = Tiers.determine(listing['item']['def_index'], listing['item']['paint_seed'])
-        link = f"https://csfloat.com/item/{listing_id}"
+        if note is not None:
+            fields.append({"name": "📝 Note", "value": f"{note}", "inline": False})
+        return fields
 
+    def map_to_new_offer(self, listing, rate):
+        price_usd = listing['price'] / 100
         fields = [
             {
                 "name": "💰 Price",
-                "value": f"**{price_eur:.2f}€** (**${price_usd:.2f}**)",
+                "value": f"**{price_usd * rate:.2f}{self.suffix}** (**${price_usd:.2f}**)",
                 "inline": True
             },
-            {
-                "name": "💎 Float",
-                "value": f"{flt}",
-                "inline": False
-            },
+            {"name": "💎 Float", "value": f"{listing['item']['float_value']}", "inline": False},
         ]
-        if tier is not None:
-            fields.append({
-                "name": "🏅 Tier",
-                "value": f"{tier}",
-                "inline": True
-            })
-        if note is not None:
-            fields.append({
-                "name": "📝 Note",
-                "value": f"{note}",
-                "inline": False
-            })
         return {
-            "title": "🆕 New offer detected!",
+            "title": NEW_OFFER_TITLE,
             "description": f"**{listing['item']['market_hash_name']}**",
-            "color": 0x2ecc71,
-            "fields": fields,
-            "url": link
+            "color": NEW_OFFER_COLOR,
+            "fields": self.add_details(fields, listing),
+            "url": f"{ITEM_URL}{listing['id']}"
         }
 
-    @staticmethod
-    def map_to_edited_offer(prev, listing, usd_to_eur):
-        prev_price_eur = prev['price'] * usd_to_eur
-        listing_id = str(listing['id'])
+    def map_to_edited_offer(self, prev_price, listing, rate):
         price_usd = listing['price'] / 100
-        price_eur = price_usd * usd_to_eur
-        delta = price_eur - prev_price_eur
-        percent = (abs(delta) / prev_price_eur) * 100 if prev_price_eur else 0
-        flt = listing['item']['float_value']
-        tier = Tiers.determine(listing['item']['def_index'], listing['item']['paint_seed'])
-        note = listing.get("description")
-        link = f"https://csfloat.com/item/{listing_id}"
-
-        if price_usd < prev['price']:
-            change_msg = f"Decrease of **{abs(delta):.2f}€** (-{percent:.2f}%)"
-            color = 0x27ae60  # Green
+        prev = prev_price * rate
+        price = price_usd * rate
+        delta = abs(price - prev)
+        percent = delta / prev * 100 if prev else 0
+        suffix = self.suffix
+        if price_usd < prev_price:
+            change_msg = f"Decrease of **{delta:.2f}{suffix}** (-{percent:.2f}%)"
+            color = DECREASE_COLOR
         else:
-            change_msg = f"Increase of **{abs(delta):.2f}€** (+{percent:.2f}%)"
-            color = 0xe67e22  # Orange
+            change_msg = f"Increase of **{delta:.2f}{suffix}** (+{percent:.2f}%)"
+            color = INCREASE_COLOR
         fields = [
             {
                 "name": "Previous price",
-                "value": f"**{prev_price_eur:.2f}€** (**${prev['price']:.2f}**)",
+                "value": f"**{prev:.2f}{suffix}** (**${prev_price:.2f}**)",
                 "inline": True
             },
             {
                 "name": "New price",
-                "value": f"**{price_eur:.2f}€** (**${price_usd:.2f}**)",
-                "inline": True
-            },
-            {
-                "name": "Change",
-                "value": change_msg,
-                "inline": False
-            },
-            {
-                "name": "💎 Float",
-                "value": f"{flt}",
+                "value": f"**{price:.2f}{suffix}** (**${price_usd:.2f}**)",
                 "inline": True
             },
+            {"name": "Change", "value": change_msg, "inline": False},
+            {"name": "💎 Float", "value": f"{listing['item']['float_value']}", "inline": True},
         ]
-        if tier is not None:
-            fields.append({
-                "name": "🏅 Tier",
-                "value": f"{tier}",
-                "inline": True
-            })
-        if note is not None:
-            fields.append({
-                "name": "📝 Note",
-                "value": f"{note}",
-                "inline": False
-            })
         return {
-            "title": "🔄 Price change detected!",
+            "title": EDITED_OFFER_TITLE,
             "description": f"**{listing['item']['market_hash_name']}**",
             "color": color,
-            "fields": fields,
-            "url": link
+            "fields": self.add_details(fields, listing),
+            "url": f"{ITEM_URL}{listing['id']}"
+        }
+
+    def digest_line(self, listing, prev_price, rate):
+        price_usd = listing['price'] / 100
+        suffix = self.suffix
+        line = f"[{listing['item']['market_hash_name']}]({ITEM_URL}{listing['id']})"
+        if prev_price is None:
+            line = f"🆕 {line} **{price_usd * rate:.2f}{suffix}**"
+        else:
+            percent = (price_usd - prev_price) / prev_price * 100 if prev_price else 0
+            line = (f"{'🔻' if price_usd < prev_price else '🔺'} {line} {prev_price * rate:.2f}{suffix} → "
+                    f"**{price_usd * rate:.2f}{suffix}** ({percent:+.2f}%)")
+        line += f" · float {listing['item']['float_value']:.6f}"
+        tier = self.tier(listing)
+        if tier is not None:
+            line += f" · {tier}"
+        return line
+
+    def map_to_digest(self, events, rate, extra=None):
+        # events are (listing, previous price in USD or None for a new listing) pairs;
+        # they are packed one per line into as few embeds as the description limit allows.
+        # extra(events of an embed) returns additional keys for that embed.
+        embeds = []
+        lines = []
+        chunk = []
+        size = 0
+        for listing, prev_price in events:
+            line = self.digest_line(listing, prev_price, rate)
+            if lines and size + len(line) + 1 > DIGEST_MAX_CHARS:
+                embeds.append(self.digest_embed(lines, extra(chunk) if extra else None))
+                lines = []
+                chunk = []
+                size = 0
+            lines.append(line)
+            chunk.append((listing, prev_price))
+            size += len(line) + 1
+        if lines:
+            embeds.append(self.digest_embed(lines, extra(chunk) if extra else None))
+        return embeds
+
+    @staticmethod
+    def digest_embed(lines, extra=None):
+        return {
+            "title": f"📋 {len(lines)} offer update{'s' if len(lines) > 1 else ''}",
+            "description": "\n".join(lines),
+            "color": DIGEST_COLOR,
+            **(extra or {})
         }
@@ -0,0 +1,214 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9108
+# Seconds; an extra +Inf bucket is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # Counters and latency histograms rendered in the Prometheus text format. Values
+    # already tracked elsewhere (notifier, transport, filters...) are read at render
+    # time by collectors returning (name, type, labels, value) tuples.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def render(self):
+        families = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                families.setdefault(name, ("counter", []))[1].append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in self.histograms.items():
+                samples = families.setdefault(name, ("histogram", []))[1]
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    samples.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                samples.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                samples.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for collect in self.collectors:
+            try:
+                for name, kind, labels, value in collect():
+                    labels = tuple(sorted(labels.items()))
+                    families.setdefault(name, (kind, []))[1].append(f"{name}{format_labels(labels)} {value}")
+            except Exception as e:
+                logging.error(f"Error collecting metrics: {e}")
+        lines = []
+        for name in sorted(families):
+            kind, samples = families[name]
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_file, path)
+
+
+class InstrumentedLock:
+    # Drop-in for threading.Lock used as a context manager, recording how long threads
+    # wait for it and how long they hold it
+
+    def __init__(self, metrics, name):
+        self.lock = threading.Lock()
+        self.metrics = metrics
+        self.name = name
+        self.acquired = 0
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self.lock.acquire()
+        self.acquired = time.perf_counter()
+        self.metrics.observe("csfloat_bot_lock_wait_seconds", self.acquired - started, lock=self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        held = time.perf_counter() - self.acquired
+        self.lock.release()
+        self.metrics.observe("csfloat_bot_lock_hold_seconds", held, lock=self.name)
+
+
+class PollProfiler:
+    # Once armed, the next poll runs under cProfile: the stats are written to
+    # profile-<timestamp>.prof and the top functions are logged
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.armed = False
+        self.lock = threading.Lock()
+
+    def arm(self):
+        with self.lock:
+            self.armed = True
+
+    @contextmanager
+    def profile(self, name):
+        with self.lock:
+            armed, self.armed = self.armed, False
+        if not armed:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            logging.info("Profile of the %s poll saved to %s\n%s", name, path, out.getvalue())
+
+
+class MetricsServer:
+    # GET /metrics returns the metrics, GET /profile profiles the next poll
+
+    def __init__(self, metrics, profiler, host, port):
+        self.metrics = metrics
+        self.profiler = profiler
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        if not self.port:
+            return
+        metrics = self.metrics
+        profiler = self.profiler
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.render().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/profile":
+                    profiler.arm()
+                    body = b"The next poll will be profiled\n"
+                    content_type = "text/plain; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logging.error(f"Error starting the metrics server on {self.host}:{self.port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        logging.info("Metrics available at http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
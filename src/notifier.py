@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+MAX_EMBEDS_PER_MESSAGE = 10
+# Discord limit on the combined text of the embeds of one message
+MAX_MESSAGE_CHARS = 6000
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 1
+DEFAULT_BATCH_DELAY = 0.5
+MAX_SEND_ATTEMPTS = 3
+MAX_RATE_LIMITED_ATTEMPTS = 10
+PENDING_RETRY_INTERVAL = 60
+# How long stop() waits for the messages being posted
+STOP_TIMEOUT = 15
+# Embed key with the (listing id, price) pairs it notifies, stripped before posting
+LISTINGS_KEY = "_listings"
+
+
+def embed_size(embed):
+    # Characters Discord counts against MAX_MESSAGE_CHARS
+    size = len(embed.get("title", "")) + len(embed.get("description", ""))
+    size += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for field in embed.get("fields", ()):
+        size += len(field.get("name", "")) + len(field.get("value", ""))
+    return size
+
+
+class DiscordNotifier:
+    # Embeds are queued by the polling threads and posted by background workers,
+    # packed up to 10 (and MAX_MESSAGE_CHARS) per webhook message. Batches that cannot be delivered (or that
+    # do not fit in the queue) are persisted to pending_file and retried later; those
+    # Discord refuses with a 4xx other than 429 would fail again and are moved to
+    # rejected_file instead. on_delivered is called with the LISTINGS_KEY pairs of
+    # every batch that is done with, posted or rejected.
+
+    def __init__(self, http, webhook, user_id, pending_file, rejected_file, queue_size=DEFAULT_QUEUE_SIZE,
+                 workers=DEFAULT_WORKERS, batch_delay=DEFAULT_BATCH_DELAY, on_delivered=None):
+        self.http = http
+        self.webhook = webhook
+        self.user_id = user_id
+        self.pending_file = pending_file
+        self.rejected_file = rejected_file
+        self.workers = workers
+        self.batch_delay = batch_delay
+        self.on_delivered = on_delivered
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.blocked_until = 0
+        self.last_pending_retry = 0
+        self.running = False
+        self.threads = []
+        self.counters = {
+            "enqueued": 0,
+            "spilled": 0,
+            "sent_messages": 0,
+            "sent_embeds": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_depth": 0,
+        }
+
+    def start(self):
+        if not self.webhook:
+            logging.warning("DISCORD_WEBHOOK not set, notifications will not be sent.")
+            return
+        self.running = True
+        self.retry_pending()
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self.worker, name=f"notifier-{idx}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        # Keeps whatever is still queued for the next start, and lets the workers
+        # finish the messages they are posting (None wakes up the idle ones)
+        self.running = False
+        embeds = []
+        while True:
+            try:
+                embeds.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if embeds:
+            self.persist(embeds)
+        for _ in self.threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self.threads = []
+
+    def enqueue(self, embed):
+        if not self.webhook:
+            logging.warning("DISCORD_WEBHOOK not set, message not sent.")
+            return
+        with self.lock:
+            self.counters['enqueued'] += 1
+        try:
+            self.queue.put_nowait(embed)
+        except queue.Full:
+            # Backpressure: never block the polling threads, spill to disk instead
+            with self.lock:
+                self.counters['spilled'] += 1
+            self.persist([embed])
+            return
+        with self.lock:
+            self.counters['max_depth'] = max(self.counters['max_depth'], self.queue.qsize())
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "queue_depth": self.queue.qsize()}
+
+    def worker(self):
+        # An embed that does not fit in a message starts the next one
+        carry = None
+        while self.running:
+            if carry is not None:
+                batch, carry = [carry], None
+            else:
+                try:
+                    batch = [self.queue.get(timeout=PENDING_RETRY_INTERVAL)]
+                except queue.Empty:
+                    self.retry_pending()
+                    continue
+                if batch[0] is None:
+                    break
+            size = embed_size(batch[0])
+            # Give a burst a moment to accumulate so that it goes out as one message
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                remaining = deadline - time.monotonic()
+                try:
+                    embed = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if embed is None:
+                    break
+                size += embed_size(embed)
+                if size > MAX_MESSAGE_CHARS:
+                    carry = embed
+                    break
+                batch.append(embed)
+            if self.send(batch):
+                if time.monotonic() - self.last_pending_retry >= PENDING_RETRY_INTERVAL:
+                    self.retry_pending()
+            else:
+                self.persist(batch)
+        if carry is not None:
+            self.persist([carry])
+
+    def send(self, batch):
+        embeds = [{k: v for k, v in embed.items() if k != LISTINGS_KEY} for embed in batch]
+        payload = {"content": f"<@{self.user_id}>\n" if self.user_id else "", "embeds": embeds}
+        attempt = 0
+        rate_limited = 0
+        while attempt < MAX_SEND_ATTEMPTS and rate_limited < MAX_RATE_LIMITED_ATTEMPTS:
+            self.wait_rate_limit()
+            try:
+                r = self.http.post(self.webhook, json=payload)
+            except Exception as e:
+                logging.error(f"Error sending to Discord: {e}")
+                r = None
+            if r is not None and r.status_code == 429:
+                retry_after = self.retry_after(r)
+                logging.warning("Discord rate limit hit, retrying in %.2fs", retry_after)
+                rate_limited += 1
+                with self.lock:
+                    self.counters['rate_limited'] += 1
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                continue
+            if r is not None and r.ok:
+                self.update_rate_limit(r)
+                with self.lock:
+                    self.counters['sent_messages'] += 1
+                    self.counters['sent_embeds'] += len(batch)
+                self.delivered(batch)
+                return True
+            if r is not None:
+                logging.error("Discord webhook returned HTTP %d: %s", r.status_code, r.text[:200])
+                if 400 <= r.status_code < 500:
+                    # The same payload would be refused again: keep it aside instead of retrying
+                    self.persist(batch, self.rejected_file)
+                    with self.lock:
+                        self.counters['rejected'] += 1
+                    self.delivered(batch)
+                    return True
+            attempt += 1
+            with self.lock:
+                self.counters['retries'] += 1
+            time.sleep(2 ** attempt)
+        with self.lock:
+            self.counters['failed'] += 1
+        return False
+
+    def delivered(self, batch):
+        listings = [tuple(pair) for embed in batch for pair in embed.get(LISTINGS_KEY, ())]
+        if listings and self.on_delivered is not None:
+            try:
+                self.on_delivered(listings)
+            except Exception as e:
+                logging.error(f"Error recording delivered notifications: {e}")
+
+    def wait_rate_limit(self):
+        with self.lock:
+            delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def retry_after(r):
+        try:
+            return float(r.json()['retry_after'])
+        except Exception:
+            return float(r.headers.get("Retry-After", 1))
+
+    def update_rate_limit(self, r):
+        # Wait for the bucket to reset instead of running into a 429
+        remaining = r.headers.get("X-RateLimit-Remaining")
+        reset_after = r.headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None and int(remaining) == 0:
+            with self.lock:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + float(reset_after))
+
+    def persist(self, embeds, path=None):
+        with self.lock:
+            with open(path or self.pending_file, "a", encoding="utf-8") as f:
+                for embed in embeds:
+                    f.write(json.dumps(embed, ensure_ascii=False) + "\n")
+
+    def pending_listings(self):
+        # Ids of the listings whose notifications wait in pending_file
+        listing_ids = set()
+        with self.lock:
+            if not os.path.exists(self.pending_file):
+                return listing_ids
+            with open(self.pending_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        listing_ids.update(pair[0] for pair in json.loads(line).get(LISTINGS_KEY, ()))
+                    except ValueError:
+                        continue
+        return listing_ids
+
+    def retry_pending(self):
+        # Moves persisted embeds back to the queue, keeping on disk those that do not fit
+        with self.lock:
+            self.last_pending_retry = time.monotonic()
+            if not os.path.exists(self.pending_file):
+                return
+            embeds = []
+            with open(self.pending_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        embeds.append(json.loads(line))
+                    except ValueError:
+                        continue
+            os.remove(self.pending_file)
+        if embeds:
+            logging.info("Retrying %d pending notification(s)", len(embeds))
+        leftover = []
+        for embed in embeds:
+            try:
+                self.queue.put_nowait(embed)
+            except queue.Full:
+                leftover.append(embed)
+        if leftover:
+            self.persist(leftover)
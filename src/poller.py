@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 600
+DEFAULT_REQUESTS_PER_MINUTE = 60
+# Adaptive intervals aim at this many history events (new, repriced or removed
+# listings) per poll
+TARGET_EVENTS_PER_POLL = 0.5
+EWMA_ALPHA = 0.2
+
+
+class ItemSchedule:
+    # An item with an explicit "interval" is polled at that fixed rate. Otherwise its
+    # interval follows the observed event rate, within [min_interval, max_interval].
+
+    def __init__(self, item, interval, min_interval, max_interval, event_rate=None):
+        self.event_rate = event_rate
+        self.failures = 0
+        self.last_poll = None
+        self.next_run = None
+        self.last_duration = None
+        self.paused = False
+        self.wakeup = asyncio.Event()
+        self.configure(item, interval, min_interval, max_interval)
+
+    def configure(self, item, interval, min_interval, max_interval):
+        # Also used when the watchlist is reloaded: the observed event rate is kept
+        self.item = item
+        self.adaptive = "interval" not in item
+        self.interval = item.get("interval", interval)
+        self.min_interval = item.get("min_interval", min_interval)
+        self.max_interval = item.get("max_interval", max_interval)
+        if self.adaptive and self.event_rate is not None:
+            self.interval = self.adaptive_interval()
+
+    def record_success(self, events, now):
+        self.failures = 0
+        if self.adaptive:
+            if self.last_poll is not None and now > self.last_poll:
+                sample = events / (now - self.last_poll)
+                if self.event_rate is None:
+                    self.event_rate = sample
+                else:
+                    self.event_rate = EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * self.event_rate
+            if self.event_rate is not None:
+                self.interval = self.adaptive_interval()
+        self.last_poll = now
+
+    def record_failure(self, retry_after=None):
+        # Returns the delay before the next attempt: exponential backoff, at least retry_after
+        self.failures += 1
+        delay = min(self.max_interval, self.interval * 2 ** self.failures)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def adaptive_interval(self):
+        if not self.event_rate:
+            return self.max_interval
+        return min(self.max_interval, max(self.min_interval, TARGET_EVENTS_PER_POLL / self.event_rate))
+
+
+class RequestBudget:
+    # Token bucket shared by every polling thread; acquire() blocks until a request
+    # fits in the requests/minute budget
+    def __init__(self, requests_per_minute):
+        self.rate = requests_per_minute / 60
+        self.capacity = max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def set_rate(self, requests_per_minute):
+        with self.lock:
+            now = time.monotonic()
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = requests_per_minute / 60
+            self.capacity = max(1.0, self.rate * 10)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def acquire(self):
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: each caller reserves its slot and waits for it
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.blocked_until - now, 0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def block(self, seconds):
+        # Called on a rate-limit response: holds every request for the given time
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class Poller:
+    # check(item) returns the number of history events of the poll and raises on
+    # failure; an exception with a retry_after attribute delays the retry accordingly
+
+    def __init__(self, check, items, default_interval, max_concurrency, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, event_rates=None):
+        self.check = check
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.schedules = {}
+        self.tasks = {}
+        self.running = False
+        self.update(items, event_rates)
+
+    def update(self, items, event_rates=None):
+        # Items are identified by name: unchanged names keep their schedule, removed ones
+        # stop being polled and new ones are polled right away
+        event_rates = event_rates or {}
+        names = {item['name'] for item in items}
+        for name in list(self.schedules):
+            if name not in names:
+                del self.schedules[name]
+                task = self.tasks.pop(name, None)
+                if task is not None:
+                    task.cancel()
+        for item in items:
+            schedule = self.schedules.get(item['name'])
+            if schedule is not None:
+                schedule.configure(item, self.default_interval, self.min_interval, self.max_interval)
+                continue
+            schedule = ItemSchedule(item, self.default_interval, self.min_interval, self.max_interval,
+                                    event_rates.get(item['name']))
+            self.schedules[item['name']] = schedule
+            if self.running:
+                self.start(schedule)
+
+    def schedule(self, name):
+        # Raises KeyError for an unknown item
+        return self.schedules[name]
+
+    def pause(self, name):
+        self.schedule(name).paused = True
+
+    def resume(self, name):
+        schedule = self.schedule(name)
+        if schedule.paused:
+            schedule.paused = False
+            self.poll_now(name)
+
+    def poll_now(self, name):
+        schedule = self.schedule(name)
+        if self.running:
+            schedule.next_run = asyncio.get_running_loop().time()
+        schedule.wakeup.set()
+
+    @staticmethod
+    async def wait(schedule, timeout):
+        # Sleeps until the timeout or until pause/resume/poll_now wakes the schedule up
+        schedule.wakeup.clear()
+        try:
+            await asyncio.wait_for(schedule.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def start(self, schedule):
+        task = asyncio.get_running_loop().create_task(self.poll_forever(schedule))
+        task.add_done_callback(self.task_done)
+        self.tasks[schedule.item['name']] = task
+
+    def task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Polling task stopped: {task.exception()}")
+
+    async def run(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        # check() is blocking, so it runs on a dedicated pool sized to the concurrency cap
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="poll") as executor:
+            self.executor = executor
+            self.running = True
+            for schedule in self.schedules.values():
+                self.start(schedule)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                self.running = False
+                for task in self.tasks.values():
+                    task.cancel()
+
+    async def poll_forever(self, schedule):
+        loop = asyncio.get_running_loop()
+        schedule.next_run = loop.time()
+        while True:
+            if schedule.paused:
+                await self.wait(schedule, None)
+                continue
+            delay = schedule.next_run - loop.time()
+            if delay > 0:
+                await self.wait(schedule, delay)
+                continue
+            async with self.semaphore:
+                started = loop.time()
+                logging.debug("⏰ Checking %s", schedule.item['name'])
+                try:
+                    events = await loop.run_in_executor(self.executor, self.check, schedule.item)
+                except Exception as e:
+                    logging.error(f"Error: {e}")
+                    events = None
+                    backoff = schedule.record_failure(getattr(e, "retry_after", None))
+                schedule.last_duration = loop.time() - started
+
+            if events is None:
+                logging.info("Retrying %s in %.0fs", schedule.item['name'], backoff)
+                schedule.next_run = loop.time() + backoff
+                continue
+            previous_interval = schedule.interval
+            schedule.record_success(events, loop.time())
+            if schedule.interval != previous_interval:
+                logging.debug("Polling %s every %.0fs", schedule.item['name'], schedule.interval)
+
+            # Deadlines advance by a fixed step so the cadence does not drift with the poll duration
+            schedule.next_run += schedule.interval
+            now = loop.time()
+            if schedule.next_run <= now:
+                missed = int((now - schedule.next_run) // schedule.interval) + 1
+                logging.warning("Polling %s is %d cycle(s) late, skipping ahead", schedule.item['name'], missed)
+                schedule.next_run += missed * schedule.interval
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+
+HEARTBEAT_INTERVAL = 5
+WORKER_TIMEOUT = 20
+RING_REPLICAS = 64
+# Notification state of a claimed listing
+CLAIMED = "claimed"
+SENT = "sent"
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def shard_key(query):
+    # Stable across watchlist reloads, unlike the query name
+    return f"{query['def_index']}/{query['paint_index']}"
+
+
+class HashRing:
+    # Consistent hashing: when a worker joins or leaves, only the keys it owns (or
+    # takes over) move
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.points = sorted((ring_hash(f"{node}#{idx}"), node) for node in nodes for idx in range(replicas))
+        self.hashes = [point for point, _ in self.points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        return self.points[bisect_right(self.hashes, ring_hash(key)) % len(self.points)][1]
+
+
+class SharedState:
+    # SQLite database shared by the workers of one host: worker membership (kept alive
+    # by heartbeats) and the dedup/price state of every listing. Claims run in an
+    # immediate transaction, so a new listing or a reprice is claimed by exactly one
+    # worker. The claim keeps the notification until the webhook accepted it, so that
+    # a worker restarted after a crash sends the ones it had not delivered.
+
+    def __init__(self, path, worker_id):
+        self.path = path
+        self.worker_id = worker_id
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, pid INTEGER, heartbeat REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS listings (id TEXT PRIMARY KEY, item TEXT, price REAL, "
+                        "updated REAL, worker TEXT)")
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(listings)")}
+        if "state" not in columns:
+            self.db.execute(f"ALTER TABLE listings ADD COLUMN state TEXT DEFAULT '{SENT}'")
+        if "notification" not in columns:
+            self.db.execute("ALTER TABLE listings ADD COLUMN notification TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS listings_updated ON listings (updated)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS listings_state ON listings (state, worker)")
+
+    def heartbeat(self):
+        # Returns the ids of the live workers, this one included
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT INTO workers (id, pid, heartbeat) VALUES (?, ?, ?) "
+                            "ON CONFLICT(id) DO UPDATE SET pid = excluded.pid, heartbeat = excluded.heartbeat",
+                            (self.worker_id, os.getpid(), now))
+            self.db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - WORKER_TIMEOUT,))
+            return sorted(row[0] for row in self.db.execute("SELECT id FROM workers"))
+
+    def leave(self, worker_id=None):
+        with self.lock:
+            self.db.execute("DELETE FROM workers WHERE id = ?", (worker_id or self.worker_id,))
+
+    def claim(self, listing_id, item_key, price, listing=None):
+        # Returns ("new", None), ("change", previous price) or (None, price) when the
+        # listing is already known at this price. A new or changed listing stays CLAIMED
+        # with its notification until mark_sent(); without listing, nothing is notified.
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT price FROM listings WHERE id = ?", (listing_id,)).fetchone()
+                if row is None:
+                    result = ("new", None)
+                elif row[0] != price:
+                    result = ("change", row[0])
+                else:
+                    result = (None, row[0])
+                if listing is not None and result[0] is not None:
+                    state, notification = CLAIMED, json.dumps({"listing": listing, "prev_price": result[1]})
+                else:
+                    state, notification = SENT, None
+                if row is None:
+                    self.db.execute("INSERT INTO listings (id, item, price, updated, worker, state, notification) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (listing_id, item_key, price, now, self.worker_id, state, notification))
+                elif result[0] is not None:
+                    self.db.execute("UPDATE listings SET price = ?, updated = ?, worker = ?, state = ?, "
+                                    "notification = ? WHERE id = ?",
+                                    (price, now, self.worker_id, state, notification, listing_id))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return result
+
+    def mark_sent(self, listings):
+        # listings are (id, price) pairs; a listing claimed again at another price since
+        # keeps its newer notification
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(f"UPDATE listings SET state = '{SENT}', notification = NULL "
+                                f"WHERE id = ? AND price = ? AND state = '{CLAIMED}'", listings)
+            self.db.execute("COMMIT")
+
+    def unsent_claims(self, exclude=frozenset()):
+        # Notifications this worker claimed but never delivered, as (listing, previous
+        # price) pairs; only meaningful at startup, before anything is in flight
+        with self.lock:
+            rows = self.db.execute(f"SELECT id, notification FROM listings WHERE state = '{CLAIMED}' "
+                                   "AND worker = ?", (self.worker_id,)).fetchall()
+        notifications = []
+        for listing_id, notification in rows:
+            if listing_id not in exclude and notification:
+                data = json.loads(notification)
+                notifications.append((data['listing'], data['prev_price']))
+        return notifications
+
+    def reassign_claims(self, workers, worker_id):
+        # Undelivered claims of workers that will not run again go to worker_id
+        with self.lock:
+            marks = ", ".join("?" for _ in workers)
+            return self.db.execute(f"UPDATE listings SET worker = ? WHERE state = '{CLAIMED}' "
+                                   f"AND worker NOT IN ({marks})", (worker_id, *workers)).rowcount
+
+    def release(self, listing_id):
+        with self.lock:
+            return self.db.execute("DELETE FROM listings WHERE id = ?", (listing_id,)).rowcount > 0
+
+    def touch(self, listing_ids, now):
+        # Listings still returned by the API are kept however old their last change is
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany("UPDATE listings SET updated = ? WHERE id = ?",
+                                ((now, listing_id) for listing_id in listing_ids))
+            self.db.execute("COMMIT")
+
+    def prune(self, before):
+        with self.lock:
+            return self.db.execute("DELETE FROM listings WHERE updated < ?", (before,)).rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
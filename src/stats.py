@@ -0,0 +1,296 @@
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+BUCKET_SECONDS = 3600
+HOURS_PER_DAY = 24
+DEFAULT_STATS_RETENTION_DAYS = 30
+# Prices are kept in logarithmic bins 1% wide, so percentiles are accurate to ~1%
+PRICE_BIN_BASE = math.log(1.01)
+
+
+def price_bin(price):
+    return round(math.log(max(price, 0.01)) / PRICE_BIN_BASE)
+
+
+def bin_price(bin_index):
+    return math.exp(bin_index * PRICE_BIN_BASE)
+
+
+class Bucket:
+    __slots__ = ("new_offers", "price_changes", "removed", "min_price", "min_float", "min_rates", "rate_sums",
+                 "tier_prices", "saved")
+
+    def __init__(self):
+        self.new_offers = 0
+        self.price_changes = 0
+        self.removed = 0
+        self.min_price = None
+        self.min_float = None
+        # Exchange rates at the time of the min price, and {currency: [sum, count]} of
+        # the rates of every priced event, to convert with the rates of the time
+        self.min_rates = {}
+        self.rate_sums = {}
+        # tier name (None when the listing has no tier) -> {price bin: count}
+        self.tier_prices = {}
+        # to_dict() as of the last save, None once the bucket changed
+        self.saved = None
+
+    def to_dict(self):
+        return {
+            "new_offers": self.new_offers,
+            "price_changes": self.price_changes,
+            "removed": self.removed,
+            "min_price": self.min_price,
+            "min_float": self.min_float,
+            "min_rates": self.min_rates,
+            "rate_sums": {currency: list(rate_sum) for currency, rate_sum in self.rate_sums.items()},
+            "tier_prices": [[tier, list(bins.items())] for tier, bins in self.tier_prices.items()]
+        }
+
+    def saved_dict(self):
+        if self.saved is None:
+            self.saved = self.to_dict()
+        return self.saved
+
+    def add(self, op, price, flt, tier, rates=None):
+        self.saved = None
+        if op == "remove":
+            # Sold or delisted: counted, but not an offer price
+            self.removed += 1
+            return
+        if op == "new":
+            self.new_offers += 1
+        else:
+            self.price_changes += 1
+        if self.min_price is None or price < self.min_price:
+            self.min_price = price
+            self.min_float = flt
+            self.min_rates = rates or {}
+        if rates:
+            for currency, rate in rates.items():
+                rate_sum = self.rate_sums.setdefault(currency, [0.0, 0])
+                rate_sum[0] += rate
+                rate_sum[1] += 1
+        bins = self.tier_prices.setdefault(tier, {})
+        b = price_bin(price)
+        bins[b] = bins.get(b, 0) + 1
+
+    def merge(self, other):
+        self.saved = None
+        self.new_offers += other.new_offers
+        self.price_changes += other.price_changes
+        self.removed += other.removed
+        if other.min_price is not None and (self.min_price is None or other.min_price < self.min_price):
+            self.min_price = other.min_price
+            self.min_float = other.min_float
+            self.min_rates = other.min_rates
+        for currency, (total, count) in other.rate_sums.items():
+            rate_sum = self.rate_sums.setdefault(currency, [0.0, 0])
+            rate_sum[0] += total
+            rate_sum[1] += count
+        for tier, other_bins in other.tier_prices.items():
+            bins = self.tier_prices.setdefault(tier, {})
+            for b, count in other_bins.items():
+                bins[b] = bins.get(b, 0) + count
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.new_offers = data['new_offers']
+        bucket.price_changes = data['price_changes']
+        bucket.removed = data.get("removed", 0)
+        bucket.min_price = data['min_price']
+        bucket.min_float = data['min_float']
+        bucket.min_rates = data.get("min_rates", {})
+        bucket.rate_sums = {currency: list(rate_sum) for currency, rate_sum in data.get("rate_sums", {}).items()}
+        bucket.tier_prices = {tier: dict(bins) for tier, bins in data['tier_prices']}
+        bucket.saved = data
+        return bucket
+
+
+class StatsIndex:
+    # Hourly and daily aggregates per item, updated as events arrive so that any
+    # window is answered from full days plus the hours at both ends instead of
+    # scanning the history
+
+    def __init__(self, retention_days=DEFAULT_STATS_RETENTION_DAYS):
+        self.retention_seconds = retention_days * 86400
+        self.buckets = {}
+        self.day_buckets = {}
+        # item key -> key of the watchlist query returning it
+        self.item_queries = {}
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def add(self, item_key, op, price, flt, timestamp, tier=None, rates=None):
+        hour = int(timestamp // BUCKET_SECONDS)
+        with self.lock:
+            self.bucket(self.buckets, item_key, hour).add(op, price, flt, tier, rates)
+            self.bucket(self.day_buckets, item_key, hour // HOURS_PER_DAY).add(op, price, flt, tier, rates)
+
+    @staticmethod
+    def bucket(buckets, item_key, index):
+        item_buckets = buckets.setdefault(item_key, {})
+        bucket = item_buckets.get(index)
+        if bucket is None:
+            bucket = item_buckets[index] = Bucket()
+        return bucket
+
+    def add_event(self, event):
+        # Events already counted in a saved index are skipped; legacy events have seq 0
+        if event['seq'] and event['seq'] <= self.seq:
+            return
+        timestamp = datetime.fromisoformat(event['timestamp']).timestamp()
+        self.add(event['item'], event['op'], event['price'], event['float'], timestamp, event.get("tier"),
+                 event.get("rates"))
+        self.seq = max(self.seq, event['seq'])
+
+    def item_keys(self):
+        with self.lock:
+            return list(self.buckets)
+
+    def link(self, query_key, item_keys):
+        with self.lock:
+            for item_key in item_keys:
+                self.item_queries[item_key] = query_key
+
+    def queries_of(self):
+        # item key -> query key
+        with self.lock:
+            return dict(self.item_queries)
+
+    def query_items(self):
+        # query key -> item keys with stats
+        queries = {}
+        with self.lock:
+            for item_key, query_key in self.item_queries.items():
+                if item_key in self.buckets:
+                    queries.setdefault(query_key, []).append(item_key)
+        return queries
+
+    def window(self, item_key, since, until):
+        first = int(since // BUCKET_SECONDS)
+        last = int(until // BUCKET_SECONDS)
+        hours = self.buckets.get(item_key, {})
+        days = self.day_buckets.get(item_key, {})
+        first_day = -(-first // HOURS_PER_DAY)
+        last_day = (last + 1) // HOURS_PER_DAY - 1
+        if first_day > last_day:
+            ranges = [(hours, first, last)]
+        else:
+            ranges = [(hours, first, first_day * HOURS_PER_DAY - 1), (days, first_day, last_day),
+                      (hours, (last_day + 1) * HOURS_PER_DAY, last)]
+        return [buckets[index] for buckets, start, end in ranges for index in range(start, end + 1)
+                if index in buckets]
+
+    # Prices are returned in currency, converted with the rates recorded with the
+    # events; default_rate is used for events recorded without rates
+
+    def summary(self, item_key, since, until, currency="USD", default_rate=1.0):
+        new_offers = 0
+        price_changes = 0
+        removed = 0
+        min_bucket = None
+        with self.lock:
+            for bucket in self.window(item_key, since, until):
+                new_offers += bucket.new_offers
+                price_changes += bucket.price_changes
+                removed += bucket.removed
+                if bucket.min_price is not None and (min_bucket is None or bucket.min_price < min_bucket.min_price):
+                    min_bucket = bucket
+        min_price = None
+        min_float = None
+        if min_bucket is not None:
+            rate = 1.0 if currency == "USD" else min_bucket.min_rates.get(currency, default_rate)
+            min_price = min_bucket.min_price * rate
+            min_float = min_bucket.min_float
+        return {"new_offers": new_offers, "price_changes": price_changes, "removed": removed,
+                "min_price": min_price, "min_float": min_float}
+
+    def percentiles(self, item_key, since, until, percentiles=(50,), currency="USD", default_rate=1.0):
+        # Returns {tier: {percentile: price}} for every tier seen in the window. Prices are
+        # converted with the average rate of the window.
+        merged = {}
+        rate_total = 0.0
+        rate_count = 0
+        with self.lock:
+            for bucket in self.window(item_key, since, until):
+                total, count = bucket.rate_sums.get(currency, (0.0, 0))
+                rate_total += total
+                rate_count += count
+                for tier, bins in bucket.tier_prices.items():
+                    tier_bins = merged.setdefault(tier, {})
+                    for b, count in bins.items():
+                        tier_bins[b] = tier_bins.get(b, 0) + count
+        if currency == "USD":
+            rate = 1.0
+        else:
+            rate = rate_total / rate_count if rate_count else default_rate
+        result = {}
+        for tier, bins in merged.items():
+            total = sum(bins.values())
+            ordered = sorted(bins.items())
+            values = {}
+            for p in percentiles:
+                rank = max(1, math.ceil(total * p / 100))
+                seen = 0
+                for b, count in ordered:
+                    seen += count
+                    if seen >= rank:
+                        values[p] = bin_price(b) * rate
+                        break
+            result[tier] = values
+        return result
+
+    def prune(self, now):
+        oldest = int((now - self.retention_seconds) // BUCKET_SECONDS)
+        with self.lock:
+            for buckets, limit in ((self.buckets, oldest), (self.day_buckets, oldest // HOURS_PER_DAY)):
+                for item_buckets in buckets.values():
+                    for index in [index for index in item_buckets if index < limit]:
+                        del item_buckets[index]
+
+    def save(self, path, seq):
+        self.write(path, self.snapshot(seq))
+
+    def snapshot(self, seq):
+        # Copy of the hourly buckets as of history event seq, taken while history is
+        # locked by the caller; write() then serializes it without holding any lock.
+        # Only the buckets changed since the last save are converted again.
+        with self.lock:
+            return {
+                "seq": seq,
+                "buckets": {
+                    item_key: [[hour, bucket.saved_dict()] for hour, bucket in item_buckets.items()]
+                    for item_key, item_buckets in self.buckets.items()
+                },
+                "queries": dict(self.item_queries)
+            }
+
+    @staticmethod
+    def write(path, data):
+        # json.dumps is much faster than json.dump, which encodes in pure Python
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_file, path)
+
+    def load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self.lock:
+            self.seq = data['seq']
+            self.buckets = {
+                item_key: {hour: Bucket.from_dict(bucket) for hour, bucket in item_buckets}
+                for item_key, item_buckets in data['buckets'].items()
+            }
+            self.item_queries = data.get("queries", {})
+            # Daily buckets are not saved, they are rebuilt from the hourly ones
+            self.day_buckets = {}
+            for item_key, item_buckets in self.buckets.items():
+                for hour, bucket in item_buckets.items():
+                    self.bucket(self.day_buckets, item_key, hour // HOURS_PER_DAY).merge(bucket)
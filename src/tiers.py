@@ -1,12 +1,58 @@
+import json
+import logging
+
+# Paint seeds range from 0 to 1000
+PAINT_SEED_COUNT = 1001
+
+
 class Tiers:
 
     @staticmethod
     def determine(def_index, paint_index):
-        item_tiers = Tiers.TIERS.get(str(def_index), {})
-        for tier_name, paint_indices in item_tiers.items():
-            if paint_index in paint_indices:
-                return tier_name
-        return None
+        table = Tiers.INDEX.get(def_index)
+        if table is None or paint_index is None or not 0 <= paint_index < PAINT_SEED_COUNT:
+            return None
+        return table[paint_index]
+
+    @staticmethod
+    def build(tiers):
+        # Compiles {def_index: {tier: seeds}} into {def_index: [tier for each seed]}. When a
+        # seed is listed in several tiers the first one wins and the conflict is reported.
+        index = {}
+        conflicts = []
+        for def_index, item_tiers in tiers.items():
+            table = [None] * PAINT_SEED_COUNT
+            for tier_name, paint_indices in item_tiers.items():
+                for paint_index in paint_indices:
+                    existing = table[paint_index]
+                    if existing is None:
+                        table[paint_index] = tier_name
+                    elif existing != tier_name:
+                        conflicts.append((def_index, paint_index, existing, tier_name))
+            index[int(def_index)] = table
+        return index, conflicts
+
+    @staticmethod
+    def compile():
+        Tiers.INDEX, Tiers.CONFLICTS = Tiers.build(Tiers.TIERS)
+
+    @staticmethod
+    def report_conflicts():
+        for def_index, paint_index, kept, ignored in Tiers.CONFLICTS:
+            logging.warning("Tier conflict for def_index %s, seed %d: in \"%s\" and \"%s\", keeping the first",
+                            def_index, paint_index, kept, ignored)
+
+    @staticmethod
+    def load(path):
+        # Extra tiers from a JSON file with the same layout as TIERS: tiers of a known
+        # def_index are added (or replaced by name), unknown def_indexes are added
+        with open(path, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+        for def_index, item_tiers in extra.items():
+            Tiers.TIERS.setdefault(str(def_index), {}).update(
+                {tier_name: tuple(paint_indices) for tier_name, paint_indices in item_tiers.items()}
+            )
+        Tiers.compile()
 
     TIERS = {
         # M9 Bayonet
@@ -93,3 +139,7 @@ class Tiers:
                                     939, 942, 947, 949, 955, 959, 967, 987, 988, 990, 994)
         }
     }
+
+
+# Compiled once at import; conflicts are logged by the bot at startup
+Tiers.compile()
@@ -0,0 +1,94 @@
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 15
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 10
+RETRY_STATUSES = (500, 502, 503, 504)
+# Methods that are safe to send twice; the others are only retried when the request
+# cannot have reached the server
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class RateLimitError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Transport:
+    def __init__(self, pool_size=10, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_count = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        # One keep-alive pool per host shared by every polling thread; retries are
+        # handled in request() so they can be counted and jittered
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                r = self.session.request(method, url, **kwargs)
+                if r.status_code not in RETRY_STATUSES or not idempotent or attempt >= self.retries:
+                    return r
+                reason = f"HTTP {r.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries or not (idempotent or self.connect_failed(e)):
+                    raise
+                reason = str(e)
+            delay = self.backoff_delay(attempt)
+            logging.warning("%s %s failed (%s), retrying in %.1fs", method, urlsplit(url).netloc, reason, delay)
+            self.retry_count += 1
+            attempt += 1
+            time.sleep(delay)
+
+    @staticmethod
+    def connect_failed(e):
+        # A read timeout or a connection dropped after sending may have been processed
+        if isinstance(e, requests.ConnectTimeout):
+            return True
+        reason = getattr(e.args[0], "reason", None) if e.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def backoff_delay(self, attempt):
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def stats(self):
+        hosts = {}
+        adapter = self.session.get_adapter("https://")
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            host = hosts.setdefault(pool.host, {"requests": 0, "new_connections": 0, "reused_connections": 0})
+            host["requests"] += pool.num_requests
+            host["new_connections"] += pool.num_connections
+            host["reused_connections"] += max(0, pool.num_requests - pool.num_connections)
+        return hosts
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+
+from filters import ListingFilter
+
+DEFAULT_ITEMS = [
+    {
+        "name": "★ M9 Bayonet | Crimson Web",
+        "def_index": 508,
+        "paint_index": 12,
+        "max_price": 1716,
+        "min_float": 0,
+        "max_float": 0.15
+    },
+    {
+        "name": "★ Karambit | Crimson Web",
+        "def_index": 507,
+        "paint_index": 12,
+        "max_price": 1716,
+        "min_float": 0,
+        "max_float": 0.15
+    },
+]
+REQUIRED_KEYS = ("name", "def_index", "paint_index")
+
+
+def load_watchlist(path):
+    # Watch rules: a JSON list of items, each with "name", "def_index", "paint_index" and
+    # optionally "min_float", "max_float", "min_price", "max_price", "tiers",
+    # "paint_seeds", "interval", "min_interval", "max_interval" and "page_size"
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError("the watchlist must be a JSON list of items")
+    for idx, rule in enumerate(rules):
+        missing = [key for key in REQUIRED_KEYS if key not in rule]
+        if missing:
+            raise ValueError(f"item #{idx} is missing {', '.join(missing)}")
+        rule.setdefault("min_float", 0)
+        rule.setdefault("max_float", 1)
+    return rules
+
+
+def rule_label(rule):
+    label = f"{rule['name']} [{rule['min_float']}-{rule['max_float']}]"
+    if rule.get("max_price") is not None:
+        label += f" ≤ ${rule['max_price']}"
+    return label
+
+
+def group_queries(rules):
+    # Rules on the same def_index/paint_index share one API query covering the union
+    # of their bounds; each result is then matched locally against every rule
+    groups = {}
+    for rule in rules:
+        groups.setdefault((rule['def_index'], rule['paint_index']), []).append(rule)
+
+    queries = []
+    for (def_index, paint_index), group in groups.items():
+        names = sorted({rule['name'] for rule in group})
+        query = {
+            "name": " / ".join(names),
+            "def_index": def_index,
+            "paint_index": paint_index,
+            "min_float": min(rule['min_float'] for rule in group),
+            "max_float": max(rule['max_float'] for rule in group),
+        }
+        # A bound is only pushed down when every rule has one
+        if all(rule.get("max_price") is not None for rule in group):
+            query['max_price'] = max(rule['max_price'] for rule in group)
+        if all(rule.get("min_price") is not None for rule in group):
+            query['min_price'] = min(rule['min_price'] for rule in group)
+        if all(rule.get("paint_seeds") for rule in group):
+            query['paint_seeds'] = sorted({seed for rule in group for seed in rule['paint_seeds']})
+        for key, pick in (("interval", min), ("min_interval", min), ("max_interval", min), ("page_size", max)):
+            values = [rule[key] for rule in group if key in rule]
+            if values:
+                query[key] = pick(values)
+        query['filter'] = ListingFilter(query)
+        query['rules'] = [(rule, ListingFilter(rule)) for rule in group]
+        queries.append(query)
+    return queries
+
+
+class Watchlist:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logging.warning("Watchlist %s not found, using the default items.", self.path)
+            self.mtime = None
+            return [dict(item) for item in DEFAULT_ITEMS]
+        self.mtime = os.stat(self.path).st_mtime_ns
+        return load_watchlist(self.path)
+
+    def changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        return mtime != self.mtime